@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import re
 import json
 import tempfile
@@ -20,9 +21,10 @@ from PySide6.QtCore import (
 )
 from PySide6.QtGui import QIcon
 
-from dopdatabaseassistant import DOPDatabaseAssistant
-from dopwebassistant import DOPWebAssistant
+from dopdatabaseassistant import DOPDatabaseAssistant, to_display_frame
+from dopwebassistant import DOPWebAssistant, DOPSessionManager, UpdateAslaasError, lot_journal, lot_journals, shard_key
 from dopfileassistant import DOPFileAssistant
+from doptaskjournal import TaskJournal
 
 from qt_material import apply_stylesheet  # Ensure this is imported after PySide6
 
@@ -51,6 +53,17 @@ class RDApplication(QMainWindow):
         self.agent_name = 'AGENTNAME'
         self.agent_husband_name = 'AGENTHUSBANDNAME'
         self.ocr_apikey = "APIKEY"
+        self.session_idle_timeout = 600
+        self.captcha_engine = "hybrid"
+        self.captcha_min_confidence = 0.85
+        self.wait_timeouts = {}
+        self.max_lot_accounts = 50
+        self.lot_cash_limit = 0
+        self.lot_parallel_sessions = 1
+        self.performance_profile = False
+        self.http_downloads = True
+        self.database_backend = 'sqlite'
+        self.snapshot_format = 'parquet'
         self.theme = "Dark"
         self.ascent = "amber"
         self.scale = "0"
@@ -61,11 +74,15 @@ class RDApplication(QMainWindow):
 
     # Method to Initialize modules
     def initialize_assistants(self):
-        self.dda = DOPDatabaseAssistant()
+        # Close the old browser session as credentials may have changed
+        if hasattr(self, 'dsm'):
+            self.dsm.close(blocking=False)
+        self.dda = DOPDatabaseAssistant(backend=self.database_backend)
         self.dwa = DOPWebAssistant()
         self.dfa = DOPFileAssistant()
         self.dwa.user_id = self.user_id
         self.dwa.user_password = self.user_password
+        self.dsm = DOPSessionManager(self.dwa, idle_timeout=int(self.session_idle_timeout))
 
     # Define UI
     def init_ui(self):
@@ -138,6 +155,7 @@ class RDApplication(QMainWindow):
     def closeEvent(self, event):
         if self.appearance_window is not None:
             self.appearance_window.close()
+        self.dsm.close(blocking=False)
         event.accept()
 
     # Reguler popup message for info
@@ -164,6 +182,17 @@ class RDApplication(QMainWindow):
             'agent_name': "AGENTNAME",
             'agent_husband_name': "AGENTHUSBANDNAME",
             'ocr_apikey':"APIKEY",
+            'session_idle_timeout': 600,
+            'captcha_engine': "hybrid",
+            'captcha_min_confidence': 0.85,
+            'wait_timeouts': {},
+            'max_lot_accounts': 50,
+            'lot_cash_limit': 0,
+            'lot_parallel_sessions': 1,
+            'performance_profile': False,
+            'http_downloads': True,
+            'database_backend': 'sqlite',
+            'snapshot_format': 'parquet',
             "theme": "Dark",
             "ascent": "blue",
             "scale": "0"
@@ -187,6 +216,17 @@ class RDApplication(QMainWindow):
             'agent_name': self.agent_name,
             'agent_husband_name': self.agent_husband_name,
             'ocr_apikey' : self.ocr_apikey,
+            'session_idle_timeout': self.session_idle_timeout,
+            'captcha_engine': self.captcha_engine,
+            'captcha_min_confidence': self.captcha_min_confidence,
+            'wait_timeouts': self.wait_timeouts,
+            'max_lot_accounts': self.max_lot_accounts,
+            'lot_cash_limit': self.lot_cash_limit,
+            'lot_parallel_sessions': self.lot_parallel_sessions,
+            'performance_profile': self.performance_profile,
+            'http_downloads': self.http_downloads,
+            'database_backend': self.database_backend,
+            'snapshot_format': self.snapshot_format,
             "theme": self.theme,
             "ascent": self.ascent,
             "scale": self.scale
@@ -210,6 +250,17 @@ class RDApplication(QMainWindow):
             self.agent_name = settings_data.get('agent_name', '')
             self.agent_husband_name = settings_data.get('agent_husband_name', '')
             self.ocr_apikey = settings_data.get('ocr_apikey','')
+            self.session_idle_timeout = settings_data.get('session_idle_timeout', 600)
+            self.captcha_engine = settings_data.get('captcha_engine', 'hybrid')
+            self.captcha_min_confidence = settings_data.get('captcha_min_confidence', 0.85)
+            self.wait_timeouts = settings_data.get('wait_timeouts', {})
+            self.max_lot_accounts = settings_data.get('max_lot_accounts', 50)
+            self.lot_cash_limit = settings_data.get('lot_cash_limit', 0)
+            self.lot_parallel_sessions = settings_data.get('lot_parallel_sessions', 1)
+            self.performance_profile = settings_data.get('performance_profile', False)
+            self.http_downloads = settings_data.get('http_downloads', True)
+            self.database_backend = settings_data.get('database_backend', 'sqlite')
+            self.snapshot_format = settings_data.get('snapshot_format', 'parquet')
             self.theme = settings_data.get('theme','')
             self.ascent = settings_data.get('ascent','')
             self.scale = settings_data.get('scale','')
@@ -244,16 +295,19 @@ class DownloadReportThread(QThread):
     def run(self):
         try:
             reports_path, dec_path = self.parent.dfa.create_directories_and_get_paths(self.parent.def_download_dir)
-            self.parent.dwa.open_browser_portal()
-            self.parent.dwa.login()
-            new_path = self.parent.dwa.perform_download_report_task(self.lot_reference, reports_path)
-            self.parent.dfa.extract_xlsx_file(new_path)
-            self.parent.dfa.format_excel_file(new_path.replace(".xls", ".xlsx"))
-            self.finished_signal.emit(new_path.replace(".xls", ".xlsx"))
+            # Several comma separated reference numbers are downloaded one after another in one session
+            ref_nos = [ref_no.strip() for ref_no in self.lot_reference.split(",") if ref_no.strip()]
+            with self.parent.dsm.session() as dwa:
+                if len(ref_nos) > 1:
+                    new_paths = list(dwa.perform_download_reports_task(ref_nos, reports_path).values())
+                else:
+                    new_paths = [dwa.perform_download_report_task(ref_nos[0], reports_path)]
+            for new_path in new_paths:
+                self.parent.dfa.extract_xlsx_file(new_path)
+                self.parent.dfa.format_excel_file(new_path.replace(".xls", ".xlsx"))
+            self.finished_signal.emit(", ".join(new_path.replace(".xls", ".xlsx") for new_path in new_paths))
         except Exception as e:
             self.finished_with_error.emit(str(e))
-        finally:
-            self.parent.dwa.close_browser()
 
 
 # ASLAAS UPDATE THREAD
@@ -261,6 +315,9 @@ class AslaasUpdateThread(QThread):
     finished_signal = Signal()
     finished_with_error = Signal(str)
 
+    # Number of confirmed accounts written to the database at once
+    SYNC_BATCH_SIZE = 20
+
     def __init__(self, parent, acc_nos, aslaas_nos, acc_ids):
         super().__init__()
         self.parent = parent
@@ -270,39 +327,89 @@ class AslaasUpdateThread(QThread):
 
     def run(self):
         try:
-            if self.acc_nos:
-                self.parent.dwa.open_browser_portal()
-                self.parent.dwa.login()
-                self.parent.dwa.perform_update_aslaas_task(self.acc_nos, self.aslaas_nos)
-                self.parent.dda.sync_aslaas_numbers(self.acc_ids, self.aslaas_nos)
+            # Accounts confirmed by an earlier interrupted run are already updated on the portal
+            journal = TaskJournal('aslaas_update')
+            confirmed = journal.records('confirmed')
+            self.pending_ids = [record['ac_id'] for record in confirmed]
+            self.pending_aslaas_nos = [record['aslaas_no'] for record in confirmed]
+            self.flush_database()
+            # A rerun with a corrected aslaas number for an account has to update it again
+            confirmed_pairs = {(record['acc_no'], record['aslaas_no']) for record in confirmed}
+
+            ids_by_no = dict(zip(self.acc_nos, self.acc_ids))
+            acc_nos = []
+            aslaas_nos = []
+            for acc_no, aslaas_no in zip(self.acc_nos, self.aslaas_nos):
+                if (acc_no, aslaas_no) not in confirmed_pairs:
+                    acc_nos.append(acc_no)
+                    aslaas_nos.append(aslaas_no)
+
+            def on_confirmed(acc_no, aslaas_no):
+                journal.append('confirmed', acc_no=acc_no, aslaas_no=aslaas_no, ac_id=int(ids_by_no[acc_no]))
+                self.pending_ids.append(ids_by_no[acc_no])
+                self.pending_aslaas_nos.append(aslaas_no)
+                if len(self.pending_ids) >= self.SYNC_BATCH_SIZE:
+                    self.flush_database()
+
+            failed = []
+            if acc_nos:
+                try:
+                    with self.parent.dsm.session() as dwa:
+                        failed = dwa.perform_update_aslaas_task(acc_nos, aslaas_nos, on_confirmed=on_confirmed)
+                finally:
+                    self.flush_database()
+
+            if failed:
+                raise UpdateAslaasError(f"Failed to update ASLAAS number of {len(failed)} accounts")
+            journal.clear()
             self.finished_signal.emit()
         except Exception as e:
             self.finished_with_error.emit(str(e))
-        finally:
-            self.parent.dwa.close_browser()
+
+    # Writes the confirmed ASLAAS numbers which are not yet in the database
+    def flush_database(self):
+        if self.pending_ids:
+            self.parent.dda.sync_aslaas_numbers(self.pending_ids, self.pending_aslaas_nos)
+            self.pending_ids = []
+            self.pending_aslaas_nos = []
 
 
 # SYNC ACCOUNTS THREAD
 class SyncAccountsThread(QThread):
-    finished_signal = Signal()
+    finished_signal = Signal(str)
     finished_with_error = Signal(str)
 
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
 
+    # Age after which an interrupted sync is started again instead of resumed
+    RESUME_HOURS = 12
+
     def run(self):
         try:
-            self.parent.dwa.open_browser_portal()
-            self.parent.dwa.login()
-            self.parent.dwa.download_accounts_list_task()
-            self.parent.dwa.download_aslaas_csv()
-            self.parent.dda.sync_database_task()
-            self.finished_signal.emit()
+            journal = TaskJournal('sync_accounts')
+            journal.expire(self.RESUME_HOURS)
+
+            fetched = journal.last('accounts_fetched')
+            aslaas = journal.last('aslaas_downloaded')
+            if fetched is None or not os.path.exists(fetched['path']) or aslaas is None:
+                with self.parent.dsm.session() as dwa:
+                    journal.append('login')
+                    if fetched is None or not os.path.exists(fetched['path']):
+                        journal.append('accounts_fetched', path=dwa.download_accounts_list_task())
+
+                    # The ASLAAS report is only needed when some account has no aslaas number
+                    use_aslaas_report = self.parent.dda.needs_aslaas_report()
+                    if use_aslaas_report:
+                        dwa.download_aslaas_csv()
+                    aslaas = {'used': use_aslaas_report}
+                    journal.append('aslaas_downloaded', **aslaas)
+            changes = self.parent.dda.sync_database_task(use_aslaas_report=aslaas.get('used', True))
+            journal.clear()
+            self.finished_signal.emit(f"{changes['new']} new, {changes['changed']} changed and {changes['closed']} closed accounts")
         except Exception as e:
             self.finished_with_error.emit(str(e))
-        finally:
-            self.parent.dwa.close_browser()
 
 
 # PERFORM LOT THREAD
@@ -319,18 +426,80 @@ class PerformLotThread(QThread):
 
     def run(self):
         try:
-            if self.acc_nos:
-                self.parent.dwa.open_browser_portal()
-                self.parent.dwa.login()
-                ref_no = self.parent.dwa.perform_lot_task(self.acc_nos,self.acc_ins)
-                new_path = self.parent.dwa.perform_download_report_task(ref_no, self.reports_path)
+            max_lot_accounts = int(self.parent.max_lot_accounts)
+            parallel_sessions = int(self.parent.lot_parallel_sessions)
+            if self.acc_nos and len(self.acc_nos) > max_lot_accounts and (parallel_sessions > 1 or self.has_shard_journals(max_lot_accounts)):
+                self.run_sharded(max_lot_accounts, max(1, parallel_sessions))
+            elif self.acc_nos:
+                # Continues an interrupted run of the same lot from its last recorded step
+                journal = lot_journal(self.acc_nos, self.acc_ins)
+                with self.parent.dsm.session() as dwa:
+                    journal.append('login')
+                    ref_no, new_path = dwa.perform_journaled_lot_task(self.acc_nos, self.acc_ins, self.reports_path, journal,
+                                                                      on_paid=lambda ref_no: self.on_lot_paid(ref_no, self.acc_nos, self.acc_ins))
                 self.parent.dfa.extract_xlsx_file(new_path)
                 self.parent.dfa.format_excel_file(new_path.replace(".xls",".xlsx"))
+                journal.clear()
             self.finished_signal.emit(self.reports_path)
         except Exception as e:
             self.finished_with_error.emit(str(e))
-        finally:
-            self.parent.dwa.close_browser()
+
+    # Checks whether an earlier run performed this lot as shards, it has to be resumed as shards so no shard is paid twice
+    def has_shard_journals(self, max_lot_accounts):
+        journals = lot_journals(self.acc_nos, self.acc_ins, max_lot_accounts)
+        return any(journal.last() is not None for journal in journals[1:]) or journals[0].last('shard_completed') is not None or journals[0].last('shard_applied') is not None
+
+    # Performs the lot as shards in parallel browser sessions and formats every downloaded report
+    def run_sharded(self, max_lot_accounts, parallel_sessions):
+        # The lot journal keeps completed and applied shards, so a rerun after a failed shard pays and applies nothing twice
+        journal = lot_journal(self.acc_nos, self.acc_ins)
+        completed = {record['shard']: record for record in journal.records('shard_completed')}
+        applied = {record['shard'] for record in journal.records('shard_applied')}
+
+        results = self.parent.dwa.perform_sharded_lot_task(self.acc_nos, self.acc_ins, self.reports_path, max_lot_accounts, parallel_sessions, completed)
+        for result in results:
+            key = shard_key(result['acc_nos'])
+            if result['ref_no'] and key not in applied:
+                # Recorded first, the amount depends on the arrears before the installments are applied
+                self.record_lot(result['ref_no'], result['acc_nos'], result['no_installments'])
+                if self.apply_paid_installments(result['ref_no'], result['acc_nos'], result['no_installments']):
+                    journal.append('shard_applied', shard=key, ref_no=result['ref_no'])
+            if result['report_path'] and not result['skipped']:
+                self.parent.dfa.extract_xlsx_file(result['report_path'])
+                self.parent.dfa.format_excel_file(result['report_path'].replace(".xls",".xlsx"))
+                journal.append('shard_completed', shard=key, ref_no=result['ref_no'], report_path=result['report_path'])
+
+        failed = [result for result in results if result['error']]
+        if failed:
+            details = "; ".join(f"accounts {', '.join(map(str, result['acc_nos']))}" + (f" (paid, reference {result['ref_no']})" if result['ref_no'] else "") for result in failed)
+            raise Exception(f"{len(failed)} of {len(results)} lot shards failed: {details}")
+
+        # Every shard succeeded, the journals of the lot and its shards are no longer needed
+        for lot_or_shard_journal in lot_journals(self.acc_nos, self.acc_ins, max_lot_accounts):
+            lot_or_shard_journal.clear()
+
+    # Applies a lot to the database and the ledger right after it is paid, before its report is downloaded
+    def on_lot_paid(self, ref_no, acc_nos, acc_ins):
+        # Recorded first, the amount depends on the arrears before the installments are applied
+        self.record_lot(ref_no, acc_nos, acc_ins)
+        self.apply_paid_installments(ref_no, acc_nos, acc_ins)
+
+    # Writes installments of a paid lot through to the database, provisional until the next sync, returns True on success
+    def apply_paid_installments(self, ref_no, acc_nos, acc_ins):
+        try:
+            self.parent.dda.apply_paid_installments(acc_nos, acc_ins, ref_no)
+            return True
+        except Exception:
+            # The error is logged by the database assistant and the next sync corrects the installments
+            return False
+
+    # Records a paid lot in the lot ledger
+    def record_lot(self, ref_no, acc_nos, acc_ins):
+        try:
+            self.parent.dda.record_lot(ref_no, acc_nos, acc_ins)
+        except Exception:
+            # The error is logged by the database assistant, a paid lot must not be reported as failed
+            pass
 
 
 # Dashboard for Agent
@@ -358,6 +527,8 @@ class WorkspacePage(QWidget):
         self.account_ids = []
         self.account_nos = []
         self.account_inst = []
+        self.lot_plan = None
+        self.planned_lots_queue = []
         self.init_ui()
 
     def init_ui(self):
@@ -368,6 +539,18 @@ class WorkspacePage(QWidget):
         self.get_account_numbers_button = QPushButton("Get Account Numbers")
         self.get_account_numbers_button.clicked.connect(self.get_account_numbers)
 
+        self.prefill_due_button = QPushButton("Pre-fill Due Accounts")
+        self.prefill_due_button.clicked.connect(self.prefill_due_accounts)
+
+        self.plan_lots_button = QPushButton("Plan Lots of Due Accounts")
+        self.plan_lots_button.clicked.connect(self.plan_lots)
+
+        self.planned_lots_combo = QComboBox()
+        self.planned_lots_combo.activated.connect(self.load_planned_lot)
+
+        self.perform_planned_lots_button = QPushButton("Perform All Planned Lots")
+        self.perform_planned_lots_button.clicked.connect(self.perform_planned_lots)
+
         self.account_numbers_label = QLabel("Account Numbers:")
         self.account_numbers_text_edit = QTextEdit()
         self.account_numbers_text_edit.setReadOnly(True)
@@ -378,6 +561,9 @@ class WorkspacePage(QWidget):
         self.perform_lot_button = QPushButton("Perform Lot and Download Report")
         self.perform_lot_button.clicked.connect(self.perform_lot)
 
+        self.discard_lot_journal_button = QPushButton("Discard Interrupted Lot")
+        self.discard_lot_journal_button.clicked.connect(self.discard_lot_journal)
+
         self.download_declaration_button = QPushButton("Download Declaration")
         self.download_declaration_button.clicked.connect(self.download_declaration)
 
@@ -385,11 +571,16 @@ class WorkspacePage(QWidget):
         layout = QVBoxLayout()
         layout.addWidget(self.client_id_label)
         layout.addWidget(self.client_id_edit)
+        layout.addWidget(self.prefill_due_button)
+        layout.addWidget(self.plan_lots_button)
+        layout.addWidget(self.planned_lots_combo)
+        layout.addWidget(self.perform_planned_lots_button)
         layout.addWidget(self.get_account_numbers_button)
         layout.addWidget(self.account_numbers_label)
         layout.addWidget(self.account_numbers_text_edit)
         layout.addWidget(self.view_details_button)
         layout.addWidget(self.perform_lot_button)
+        layout.addWidget(self.discard_lot_journal_button)
         layout.addWidget(self.download_declaration_button)
 
         self.setLayout(layout)
@@ -397,21 +588,85 @@ class WorkspacePage(QWidget):
 
         self.parent.create_sidebar_button("Workspace", 1, "./_internal/static/workspace.svg")
 
+    # Fills client IDs with every active account which has installments due, with its number of installments
+    def prefill_due_accounts(self):
+        try:
+            tokens = self.parent.dda.get_due_account_tokens()
+            if not tokens:
+                self.parent.show_popup_message("Message", "No accounts are due")
+                return
+            self.client_id_edit.setText(",".join(tokens))
+            self.get_account_numbers()
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while finding due accounts")
+
+    # Plans lots of all due accounts and lists them for selection
+    def plan_lots(self):
+        try:
+            self.lot_plan = self.parent.dda.plan_lots(int(self.parent.max_lot_accounts), float(self.parent.lot_cash_limit))
+            self.planned_lots_combo.clear()
+            for lot in self.lot_plan['lots']:
+                self.planned_lots_combo.addItem(f"Lot {lot['index'] + 1}: {lot['accounts']} accounts, {sum(lot['installments'])} installments, Rs. {lot['amount']:.0f}")
+            if self.lot_plan['lots']:
+                self.load_planned_lot(0)
+            self.parent.show_popup_message("Message", f"Planned {len(self.lot_plan['lots'])} lots of {self.lot_plan['accounts']} accounts, {self.lot_plan['installments']} installments, Rs. {self.lot_plan['amount']:.0f}")
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while planning lots")
+
+    # Takes index of a planned lot and loads its accounts in the workspace, keeping the planned order
+    def load_planned_lot(self, index):
+        if not self.lot_plan or not 0 <= index < len(self.lot_plan['lots']):
+            return
+        lot = self.lot_plan['lots'][index]
+        self.client_id_edit.setText(",".join(f"{ac_id}-{installments}" for ac_id, installments in zip(lot['ac_ids'], lot['installments'])))
+        self.account_ids = [str(ac_id) for ac_id in lot['ac_ids']]
+        self.account_inst = list(lot['installments'])
+        self.account_nos = list(lot['ac_nos'])
+        self.account_numbers_text_edit.setPlainText(", ".join(self.account_nos))
+
+    # Performs every planned lot one after another
+    def perform_planned_lots(self):
+        if not self.lot_plan or not self.lot_plan['lots']:
+            self.parent.show_error_message("Error", "Plan lots before performing them")
+            return
+        self.planned_lots_queue = list(range(len(self.lot_plan['lots'])))
+        self.perform_next_planned_lot()
+
+    # Performs the next lot of the planned lots queue
+    def perform_next_planned_lot(self):
+        if not self.planned_lots_queue:
+            self.parent.show_popup_message("Message", "All planned lots performed")
+            return
+        index = self.planned_lots_queue.pop(0)
+        self.planned_lots_combo.setCurrentIndex(index)
+        self.load_planned_lot(index)
+        try:
+            reports_path, dec_path = self.parent.dfa.create_directories_and_get_paths(self.parent.def_download_dir)
+            self.perform_lot_thread = PerformLotThread(self.parent, self.account_nos, self.account_inst, reports_path)
+            self.perform_lot_thread.finished_signal.connect(lambda path: self.perform_next_planned_lot())
+            self.perform_lot_thread.finished_with_error.connect(self.perform_planned_lot_error)
+            self.perform_lot_thread.start()
+        except Exception as e:
+            self.planned_lots_queue = []
+            self.parent.show_error_message("Error", "Error While Performing Lot")
+
+    def perform_planned_lot_error(self, error_message):
+        # Stop so the failed lot can be resumed from its journal before the next ones
+        self.planned_lots_queue = []
+        self.parent.show_error_message("Error", f"Error While Performing Planned Lot: {error_message}")
+
     def get_account_numbers(self):
         try:
             # Get the entered client IDs separated by commas
             client_ids_str = self.client_id_edit.text()
 
-            # Get active account id's
-            active_acc_ids = self.parent.dda.get_list_of_active_account_ids()
-
             # Split the input into a list of individual client IDs
             client_code = client_ids_str.split(",")
             acc_ids = []
             acc_inst = []
             for code in client_code:
                 ac_data = code.split('-')
-                if str(ac_data[0]) in active_acc_ids:
+                if self.parent.dda.is_active_account(ac_data[0]):
                     acc_ids.append(str(ac_data[0]))
                     if len(ac_data)==2 and not ac_data[1]=="":
                         acc_inst.append(ac_data[1])
@@ -458,12 +713,13 @@ class WorkspacePage(QWidget):
             df['installments'] = acc_ins
 
             # Multiply the 'denomination' column with the values
-            df.denomination = df.denomination.astype(int) * df.installments.astype(int)
+            df.denomination = df.denomination * df.installments
 
             # Create a new column with sequential numbering starting from 1
             df.insert(0, 'sr_no', range(1, len(df) + 1))
 
             total_amount = df.denomination.sum()
+            df = to_display_frame(df)
             df.loc[len(df.index)] = ["", "", "", 'Total Amount : ', total_amount, "", ""]
 
             # Display the account numbers and client details in a pop-up window
@@ -529,12 +785,32 @@ class WorkspacePage(QWidget):
         except:
             self.parent.show_error_message("Error","Error While Performing Lot")
 
+    # Discards the journals of an interrupted lot of the current accounts and of its shards so it is performed from the start
+    def discard_lot_journal(self):
+        try:
+            journals = lot_journals(self.account_nos, list(map(int, self.account_inst)), int(self.parent.max_lot_accounts))
+            interrupted = [(index, journal, journal.last()) for index, journal in enumerate(journals) if journal.last() is not None]
+            if not interrupted:
+                self.parent.show_popup_message("Message", "No interrupted lot of these accounts")
+                return
+            # The first journal is the one of the whole lot, the others belong to its shards
+            details = "\n".join(f"{'Whole lot' if index == 0 else f'Shard {index}'}: step '{last['step']}' at {last['time']}" for index, journal, last in interrupted)
+            answer = QMessageBox.question(self, "Discard Interrupted Lot",
+                                          f"The lot of these accounts was interrupted:\n{details}\n"
+                                          "Check on the portal that it was not paid before discarding it. Discard it?")
+            if answer == QMessageBox.Yes:
+                for index, journal, last in interrupted:
+                    journal.clear()
+                self.parent.show_popup_message("Message", "Interrupted lot discarded")
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while discarding interrupted lot")
+
     def perform_lot_completed(self, path):
         # Add any additional UI updates or operations needed after the download completes
         self.parent.show_popup_message("Message", f"Lot Performed Sucessfuly. Downloaded report at: {path}")
 
     def perform_lot_error(self, error_message):
-        self.parent.show_error_message("Error" , "Error While Performing Lot")
+        self.parent.show_error_message("Error" , f"Error While Performing Lot: {error_message}")
 
     def download_declaration(self):
         try:
@@ -644,10 +920,15 @@ class ViewAccountsPage(QWidget):
         self.refresh_button = QPushButton("Refresh")
         self.refresh_button.clicked.connect(self.refresh_accounts)
 
+        # Export Button
+        self.export_button = QPushButton("Export CSV")
+        self.export_button.clicked.connect(self.export_accounts)
+
         # Layout for ViewClientsPage
         layout = QVBoxLayout()
         layout.addWidget(self.client_table_widget)
         layout.addWidget(self.refresh_button)
+        layout.addWidget(self.export_button)
         layout.addWidget(self.print_button)
 
         self.setLayout(layout)
@@ -682,15 +963,29 @@ class ViewAccountsPage(QWidget):
         # Clear existing rows
         self.client_table_widget.setRowCount(0)
 
+        # Installments written after a lot and not yet confirmed by a sync are marked with *
+        provisional = self.parent.dda.get_provisional_updates()
+
         # Add new rows with account data
         for index, row in account_data.iterrows():
-            self.add_client_to_table(str(row['ac_id']), str(row['ac_no']), str(row['acc_holder_name']), str(row['denomination']), str(row['no_of_installments']), str(row['acc_opening_date']), str(row['is_active']), str(row['aslaas_no']))
+            installments = str(row['no_of_installments']) + ("*" if str(row['ac_id']) in provisional else "")
+            self.add_client_to_table(str(row['ac_id']), str(row['ac_no']), str(row['acc_holder_name']), str(row['denomination']), installments, str(row['acc_opening_date']), str(row['is_active']), str(row['aslaas_no']))
 
     def refresh_accounts(self):
         self.account_data = self.parent.dda.get_all_accounts()
         self.clear_table()
         self.populate_table(self.account_data)
 
+    def export_accounts(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Accounts", os.path.join(self.parent.def_download_dir, "Accounts.csv"), "CSV Files (*.csv)")
+        if not file_path:
+            return
+        try:
+            self.parent.dda.export_csv(file_path)
+            self.parent.show_popup_message("Message", f"Accounts exported to: {file_path}")
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while exporting accounts")
+
     def print_accounts(self):
         df = self.parent.dda.get_all_accounts()
         # Save DataFrame to a temporary HTML file
@@ -748,14 +1043,11 @@ class AslaasUpdatePage(QWidget):
             aslaas_nos = []
             acc_ids = []
 
-            # Get active account id's
-            active_acc_ids = self.parent.dda.get_list_of_active_account_ids()
-
             # Split the input into a list of individual client IDs
             client_code = client_ids_str.split(",")
             for code in client_code:
                 ac_data = code.split('-')
-                if str(ac_data[0]) in active_acc_ids:
+                if self.parent.dda.is_active_account(ac_data[0]):
                     acc_ids.append(str(ac_data[0]))
                     if len(ac_data)==2 and not ac_data[1]=="":
                         aslaas_nos.append(ac_data[1])
@@ -820,23 +1112,101 @@ class DownloadReportPage(QWidget):
         # Add widgets and layout for InterestCalculatorPage
         layout = QVBoxLayout()
         # Lot Reference Number Input
-        self.lot_reference_label = QLabel("Lot Reference Number:")
+        self.lot_reference_label = QLabel("Lot Reference Numbers (separated by comma):")
         self.lot_reference_edit = QLineEdit()
 
         # Download Button
         self.download_button = QPushButton("Download Report")
         self.download_button.clicked.connect(self.download_report)
 
+        # Lot Ledger Search, by account number or id and optional month
+        self.ledger_label = QLabel("Performed Lots (select to download their reports):")
+        self.ledger_account_edit = QLineEdit()
+        self.ledger_account_edit.setPlaceholderText("Account No. or ID (empty for recent lots)")
+        self.ledger_month_edit = QLineEdit()
+        self.ledger_month_edit.setPlaceholderText("Month YYYY-MM (optional)")
+        self.ledger_search_button = QPushButton("Search Lots")
+        self.ledger_search_button.clicked.connect(self.search_lots)
+        self.monthly_totals_button = QPushButton("Monthly Totals")
+        self.monthly_totals_button.clicked.connect(self.show_monthly_totals)
+
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.ledger_account_edit)
+        search_layout.addWidget(self.ledger_month_edit)
+        search_layout.addWidget(self.ledger_search_button)
+        search_layout.addWidget(self.monthly_totals_button)
+
+        # Lot Ledger Table
+        self.lots_table_widget = QTableWidget()
+        self.lots_table_widget.setColumnCount(5)
+        self.lots_table_widget.setHorizontalHeaderLabels(["Ref. No.", "Date", "Accounts", "Installments", "Amount"])
+        self.lots_table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.lots_table_widget.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.lots_table_widget.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.lots_table_widget.verticalHeader().setVisible(False)
+        self.lots_table_widget.itemSelectionChanged.connect(self.select_lots)
+
         layout.addWidget(self.lot_reference_label)
         layout.addWidget(self.lot_reference_edit)
         layout.addWidget(self.download_button)
-        layout.addStretch()
+        layout.addWidget(self.ledger_label)
+        layout.addLayout(search_layout)
+        layout.addWidget(self.lots_table_widget)
 
         self.setLayout(layout)
         self.parent.stacked_widget.addWidget(self)
+        self.search_lots()
 
         self.parent.create_sidebar_button("Download Report", 4, "./_internal/static/download.svg")
 
+    def search_lots(self):
+        try:
+            account = self.ledger_account_edit.text().strip()
+            month = self.ledger_month_edit.text().strip() or None
+            ledger = self.parent.dda.ledger
+            if not account:
+                lots = ledger.lots_for_month(month) if month else ledger.recent_lots()
+            else:
+                # Account numbers are matched first, then account ids, both against the database
+                dda = self.parent.dda
+                dda.refresh()
+                if account in dda.row_by_no:
+                    lots = ledger.lots_for_account(ac_no=account, month=month)
+                elif account.isdigit() and int(account) in dda.row_by_id:
+                    lots = ledger.lots_for_account(ac_id=int(account), month=month)
+                else:
+                    self.parent.show_error_message("Error", f"No account with number or id {account}")
+                    return
+            self.populate_lots_table(lots)
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while searching performed lots")
+
+    def populate_lots_table(self, lots):
+        self.lots_table_widget.setRowCount(0)
+        for row in lots.itertuples(index=False):
+            accounts = getattr(row, 'accounts', 1)
+            values = [row.ref_no, row.performed_at.replace("T", " "), accounts, row.installments, "" if pd.isna(row.amount) else f"{row.amount:.0f}"]
+            position = self.lots_table_widget.rowCount()
+            self.lots_table_widget.insertRow(position)
+            for column, value in enumerate(values):
+                self.lots_table_widget.setItem(position, column, QTableWidgetItem(str(value)))
+
+    def select_lots(self):
+        rows = sorted({index.row() for index in self.lots_table_widget.selectedIndexes()})
+        ref_nos = list(dict.fromkeys(self.lots_table_widget.item(row, 0).text() for row in rows))
+        self.lot_reference_edit.setText(",".join(ref_nos))
+
+    def show_monthly_totals(self):
+        try:
+            totals = self.parent.dda.ledger.monthly_totals(self.ledger_month_edit.text().strip() or None)
+            if totals.empty:
+                self.parent.show_popup_message("Message", "No lots performed yet")
+                return
+            lines = [f"{row.month}: {row.lots} lots, {row.accounts} accounts, {row.installments} installments, Rs. {row.amount:.0f}" for row in totals.itertuples(index=False)]
+            self.parent.show_popup_message("Monthly Totals", "\n".join(lines))
+        except Exception as e:
+            self.parent.show_error_message("Error", "Error while computing monthly totals")
+
     def download_report(self):
         try:
             referance_number = self.lot_reference_edit.text()
@@ -955,6 +1325,11 @@ class SettingsPage(QWidget):
         self.ocr_apikey_edit_button = QPushButton("Edit")
         self.ocr_apikey_edit_button.clicked.connect(self.edit_ocr_apikey)
 
+        # Performance Profile
+        self.performance_profile_checkbox = QCheckBox("Performance Profile (headless lean browser)")
+        self.performance_profile_checkbox.setChecked(bool(self.parent.performance_profile))
+        self.performance_profile_checkbox.stateChanged.connect(self.toggle_performance_profile)
+
         # Sync Accounts
         self.sync_accounts_button = QPushButton("  Sync Accounts")
         self.sync_accounts_button.setIcon(QIcon("./_internal/static/sync.svg"))
@@ -1092,6 +1467,9 @@ class SettingsPage(QWidget):
         layout.addWidget(self.ocr_apikey_label)
         layout.addLayout(ocr_apikey_hbox)
 
+        # Performance Profile
+        layout.addWidget(self.performance_profile_checkbox)
+
         # Sync Accounts
         layout.addWidget(self.sync_accounts_button)
 
@@ -1239,6 +1617,11 @@ class SettingsPage(QWidget):
         self.ocr_apikey_edit_mode = not self.ocr_apikey_edit_mode
         self.ocr_apikey_edit_button.setText("Edit" if not self.ocr_apikey_edit_mode else "Save")
 
+    def toggle_performance_profile(self, state):
+        self.parent.performance_profile = (state == 2)
+        self.parent.save_settings()
+        self.parent.initialize_assistants()
+
     def toggle_password_visibility(self, state):
         if state == 2:
             self.password_edit.setEchoMode(QLineEdit.Normal)
@@ -1272,8 +1655,8 @@ class SettingsPage(QWidget):
     def aslaas_update_error(self):
         self.parent.show_error_message("Error", "Error while syncing Aslaas")
 
-    def sync_accounts_completed(self):
-        self.parent.show_popup_message("Message", "Accounts Sync Sucessful")
+    def sync_accounts_completed(self, changes):
+        self.parent.show_popup_message("Message", f"Accounts Sync Sucessful\n{changes}")
 
     def sync_accounts_error(self):
         self.parent.show_error_message("Error", "Error while syncing Accounts")
@@ -1383,6 +1766,8 @@ class AppearanceWindow(QDialog):
 
 
 if __name__ == "__main__":
+    # Needed by the process pool of parallel lots in the packaged application
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = RDApplication()
 
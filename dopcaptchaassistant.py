@@ -0,0 +1,331 @@
+import os
+import io
+import json
+import logging
+
+import numpy as np
+import requests
+from PIL import Image, ImageFilter
+
+
+# Configure the logging settings
+logging.basicConfig(filename='doplogs.log' ,level=20, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# Custom Error Class
+class CaptchaEngineError(Exception):
+    pass
+
+
+# Takes png bytes of captcha and returns cleaned grayscale PIL image
+def preprocess_captcha(png):
+    """
+    Loads the CAPTCHA screenshot from memory and removes noise with a median filter.
+
+    Args:
+    png (bytes): PNG bytes of the CAPTCHA image.
+
+    Returns:
+    Image: The filtered grayscale image.
+    """
+    image = Image.open(io.BytesIO(png))
+    image = image.filter(ImageFilter.MedianFilter(size=3))
+    return image.convert('L')
+
+
+# Solves captcha using OCRSpace API without writing the image to disk
+class OCRSpaceCaptchaEngine:
+    # Characters which can appear in a captcha of the portal
+    CAPTCHA_CHARACTERS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789")
+
+    def __init__(self, apikey, language='eng', min_length=4, max_length=8):
+        self.apikey = apikey
+        self.language = language
+        self.min_length = min_length
+        self.max_length = max_length
+        self.ready = True
+
+
+    # Takes png bytes of captcha and returns solved text and confidence
+    def solve(self, png):
+        """
+        Performs OCR on the CAPTCHA image using the OCRSpace API.
+
+        Args:
+        png (bytes): PNG bytes of the CAPTCHA image.
+
+        OCRSpace does not report a confidence, so it is estimated from the text: the share of
+        characters which can appear in a captcha, and 0.0 if the length can not be a captcha.
+
+        Returns:
+        tuple: The extracted text and its estimated confidence, or an empty text and 0.0 if nothing was read.
+        """
+        buffer = io.BytesIO()
+        preprocess_captcha(png).save(buffer, format='PNG')
+
+        payload = {
+            'isOverlayRequired': False,
+            'apikey': self.apikey,
+            'language': self.language,
+        }
+
+        try:
+            r = requests.post('https://api.ocr.space/parse/image',
+                              files={'captcha.png': ('captcha.png', buffer.getvalue(), 'image/png')},
+                              data=payload)
+            data = r.json()
+            text = data["ParsedResults"][0]["ParsedText"].strip().replace(" ", "")
+        except Exception as e:
+            # OCR failures are reported as an unreadable captcha
+            logging.error(f"Error during OCR processing: {e}")
+            return "", 0.0
+
+        return text, self.estimate_confidence(text)
+
+
+    # Takes OCR text and returns how likely it is a complete captcha read
+    def estimate_confidence(self, text):
+        if not self.min_length <= len(text) <= self.max_length:
+            return 0.0
+        return sum(char in self.CAPTCHA_CHARACTERS for char in text) / len(text)
+
+
+# Offline captcha solver which segments the captcha into glyphs and matches them with learned templates
+class TemplateCaptchaEngine:
+    GLYPH_SIZE = 16
+
+    def __init__(self, templates_path='captcha_templates.json', min_glyphs=4, max_glyphs=8, max_samples=25):
+        """
+        Initializes the offline solver and loads the learned glyph templates.
+
+        Args:
+        templates_path (str, optional): JSON file where glyph templates are stored. Defaults to 'captcha_templates.json'.
+        min_glyphs (int, optional): Minimum number of characters in a CAPTCHA. Defaults to 4.
+        max_glyphs (int, optional): Maximum number of characters in a CAPTCHA. Defaults to 8.
+        max_samples (int, optional): Maximum number of templates kept per character. Defaults to 25.
+        """
+        self.templates_path = templates_path
+        self.min_glyphs = min_glyphs
+        self.max_glyphs = max_glyphs
+        self.max_samples = max_samples
+        self.templates = {}
+        self.load_templates()
+
+
+    # True once templates were learned, without them every read has confidence 0
+    @property
+    def ready(self):
+        return len(self.labels) > 0
+
+
+    # Loads glyph templates from json file if it exists
+    def load_templates(self):
+        self.templates = {}
+        if not os.path.exists(self.templates_path):
+            self.build_matrix()
+            return
+        try:
+            with open(self.templates_path, 'r') as file:
+                data = json.load(file)
+            for char, samples in data.get('templates', {}).items():
+                self.templates[char] = [np.array([bit == '1' for bit in sample], dtype=bool) for sample in samples]
+            logging.info(f"Loaded CAPTCHA templates for {len(self.templates)} characters.")
+        except Exception as e:
+            logging.error(f"Error while loading CAPTCHA templates: {e}")
+        self.build_matrix()
+
+
+    # Saves glyph templates to json file using a temporary file and atomic rename
+    def save_templates(self):
+        data = {
+            'glyph_size': self.GLYPH_SIZE,
+            'templates': {
+                char: [''.join('1' if bit else '0' for bit in sample) for sample in samples]
+                for char, samples in self.templates.items()
+            }
+        }
+        # Parallel browser sessions may learn at the same time, so the temporary file is per process
+        temp_path = f"{self.templates_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.templates_path)
+
+
+    # Stacks all templates in one matrix so a glyph is compared with every template at once
+    def build_matrix(self):
+        self.labels = [char for char, samples in self.templates.items() for _ in samples]
+        samples = [sample for char_samples in self.templates.values() for sample in char_samples]
+        self.matrix = np.vstack(samples) if samples else np.zeros((0, self.GLYPH_SIZE * self.GLYPH_SIZE), dtype=bool)
+
+
+    # Takes png bytes and returns a boolean array where True is a dark (text) pixel
+    def binarize(self, png):
+        pixels = np.asarray(preprocess_captcha(png), dtype=np.uint8)
+
+        # Otsu threshold on the grayscale histogram
+        histogram = np.bincount(pixels.ravel(), minlength=256).astype(float)
+        total = pixels.size
+        weights = np.cumsum(histogram)
+        means = np.cumsum(histogram * np.arange(256))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            between = (means[-1] * weights / total - means) ** 2 / (weights * (total - weights))
+        threshold = int(np.nanargmax(between))
+
+        binary = pixels <= threshold
+        # Text covers less area than background, invert for light text on dark background
+        if binary.mean() > 0.5:
+            binary = ~binary
+        return binary
+
+
+    # Takes binary captcha and splits it into glyph arrays using column projection
+    def segment(self, binary):
+        columns = binary.sum(axis=0) > 0
+        runs = []
+        start = None
+        for x, filled in enumerate(columns):
+            if filled and start is None:
+                start = x
+            elif not filled and start is not None:
+                runs.append((start, x))
+                start = None
+        if start is not None:
+            runs.append((start, len(columns)))
+
+        # Drop specks left by the median filter
+        runs = [(a, b) for a, b in runs if b - a > 1 and binary[:, a:b].sum() >= 8]
+        if not runs:
+            return []
+
+        # Split runs of touching characters into equal parts
+        median_width = float(np.median([b - a for a, b in runs]))
+        glyphs = []
+        for a, b in runs:
+            parts = max(1, int(round((b - a) / median_width))) if (b - a) > 1.6 * median_width else 1
+            edges = np.linspace(a, b, parts + 1).astype(int)
+            for left, right in zip(edges[:-1], edges[1:]):
+                glyph = binary[:, left:right]
+                rows = np.where(glyph.any(axis=1))[0]
+                if len(rows):
+                    glyphs.append(glyph[rows[0]:rows[-1] + 1])
+        return glyphs
+
+
+    # Takes glyph array and returns flattened fixed size boolean vector
+    def normalize(self, glyph):
+        image = Image.fromarray(glyph.astype(np.uint8) * 255)
+        image = image.resize((self.GLYPH_SIZE, self.GLYPH_SIZE), Image.BILINEAR)
+        return (np.asarray(image) > 127).ravel()
+
+
+    # Takes png bytes of captcha and returns solved text and confidence
+    def solve(self, png):
+        """
+        Reads the CAPTCHA offline by matching each segmented glyph against learned templates.
+
+        Args:
+        png (bytes): PNG bytes of the CAPTCHA image.
+
+        Returns:
+        tuple: The extracted text and a confidence between 0 and 1. The confidence is the
+        similarity of the worst matching glyph, or 0.0 if the image could not be segmented.
+        """
+        if len(self.labels) == 0:
+            return "", 0.0
+
+        glyphs = self.segment(self.binarize(png))
+        if not self.min_glyphs <= len(glyphs) <= self.max_glyphs:
+            return "", 0.0
+
+        text = ""
+        confidence = 1.0
+        for glyph in glyphs:
+            scores = (self.matrix == self.normalize(glyph)).mean(axis=1)
+            best = int(np.argmax(scores))
+            text += self.labels[best]
+            confidence = min(confidence, float(scores[best]))
+        return text, confidence
+
+
+    # Takes png bytes and its confirmed text and stores the glyphs as templates
+    def learn(self, png, text):
+        """
+        Adds the glyphs of a correctly solved CAPTCHA to the templates.
+
+        Args:
+        png (bytes): PNG bytes of the CAPTCHA image.
+        text (str): The text confirmed by a successful login.
+        """
+        glyphs = self.segment(self.binarize(png))
+        if len(glyphs) != len(text):
+            logging.info("CAPTCHA segmentation does not match the confirmed text, not learning it.")
+            return
+
+        for char, glyph in zip(text, glyphs):
+            samples = self.templates.setdefault(char, [])
+            samples.append(self.normalize(glyph))
+            # Keep only the newest samples per character
+            del samples[:-self.max_samples]
+
+        self.build_matrix()
+        try:
+            self.save_templates()
+        except OSError as e:
+            logging.error(f"Error while saving CAPTCHA templates: {e}")
+
+
+# Solves captcha offline and falls back to OCRSpace when the offline read is not confident, learning from it
+class HybridCaptchaEngine:
+    def __init__(self, local_engine, remote_engine, min_confidence=0.85):
+        self.local_engine = local_engine
+        self.remote_engine = remote_engine
+        self.min_confidence = min_confidence
+        self.ready = True
+
+
+    # Takes png bytes of captcha and returns solved text and confidence
+    def solve(self, png):
+        text, confidence = self.local_engine.solve(png)
+        if confidence >= self.min_confidence:
+            return text, confidence
+        return self.remote_engine.solve(png)
+
+
+    # Takes png bytes and its confirmed text and teaches the offline engine
+    def learn(self, png, text):
+        self.local_engine.learn(png, text)
+
+
+# Takes engine name and settings and returns the captcha engine
+def create_captcha_engine(name, ocr_apikey, min_confidence=0.85):
+    """
+    Creates the CAPTCHA engine selected in settings.
+
+    The offline engine can only read captchas after it learned templates, so 'local' without
+    templates starts as 'hybrid' when an OCRSpace key is set and learns its first templates
+    from logins solved by OCRSpace. Without a key it is returned not ready and login fails
+    with a clear error.
+
+    Args:
+    name (str): One of 'local', 'ocrspace' or 'hybrid'.
+    ocr_apikey (str): API key used by the OCRSpace engine.
+    min_confidence (float, optional): Confidence below which the hybrid engine asks OCRSpace. Defaults to 0.85.
+
+    Returns:
+    object: An engine with a solve(png) method returning (text, confidence) and a ready flag.
+
+    Raises:
+    CaptchaEngineError: If the engine name is unknown.
+    """
+    if name == 'local':
+        engine = TemplateCaptchaEngine()
+        if not engine.ready and ocr_apikey:
+            logging.info("No CAPTCHA templates learned yet, bootstrapping the offline engine with OCRSpace.")
+            return HybridCaptchaEngine(engine, OCRSpaceCaptchaEngine(ocr_apikey), min_confidence)
+        return engine
+    elif name == 'ocrspace':
+        return OCRSpaceCaptchaEngine(ocr_apikey)
+    elif name == 'hybrid':
+        return HybridCaptchaEngine(TemplateCaptchaEngine(), OCRSpaceCaptchaEngine(ocr_apikey), min_confidence)
+    else:
+        raise CaptchaEngineError(f"Unknown CAPTCHA engine: {name}")
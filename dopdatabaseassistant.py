@@ -1,7 +1,17 @@
 import os
 import glob
+import json
+import bisect
+import hashlib
+import sqlite3
 import logging
+import threading
+from datetime import datetime
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 
 # Configure the logging settings
@@ -13,19 +23,912 @@ class UpdateTaskError(Exception):
 class DatabaseError(Exception):
     pass
 
-# Does not take any argument while initialize
+
+# Columns of the accounts table in storage order
+ACCOUNT_COLUMNS = ['ac_no', 'ac_id', 'acc_holder_name', 'denomination', 'acc_opening_date',
+                   'no_of_installments', 'is_active', 'aslaas_no']
+
+
+# Columns of an RDRecord snapshot in storage order
+SNAPSHOT_COLUMNS = ['ac_no', 'acc_holder_name', 'denomination', 'no_of_installments', 'is_active', 'acc_opening_date']
+
+# Arrow schema of the accounts table, holder names repeat across snapshots so they are dictionary encoded
+ACCOUNT_SCHEMA = pa.schema([
+    ('ac_no', pa.string()),
+    ('ac_id', pa.int64()),
+    ('acc_holder_name', pa.dictionary(pa.int32(), pa.string())),
+    ('denomination', pa.int64()),
+    ('acc_opening_date', pa.date32()),
+    ('no_of_installments', pa.int64()),
+    ('is_active', pa.int8()),
+    ('aslaas_no', pa.string())
+])
+
+# Arrow schema of an RDRecord snapshot
+SNAPSHOT_SCHEMA = pa.schema([ACCOUNT_SCHEMA.field(column) for column in SNAPSHOT_COLUMNS])
+
+
+# Pandas dtypes of the in-memory accounts table, text is stored in arrow string arrays
+ACCOUNT_DTYPES = {
+    'ac_no': 'string[pyarrow]',
+    'ac_id': 'int32',
+    'acc_holder_name': 'string[pyarrow]',
+    'denomination': 'Int32',
+    'acc_opening_date': 'datetime64[ns]',
+    'no_of_installments': 'Int32',
+    'is_active': pd.CategoricalDtype(categories=[0, 1]),
+    'aslaas_no': 'string[pyarrow]'
+}
+
+
+# Takes accounts DataFrame from any storage and returns it with the columns and dtypes of ACCOUNT_DTYPES
+def apply_account_schema(df):
+    """
+    Enforces the typed accounts schema, whatever types the storage returned.
+
+    Rows without a valid account id can not be addressed by any lookup, so they are dropped
+    and logged instead of failing the whole table.
+
+    Args:
+    df (DataFrame): Accounts with the columns of ACCOUNT_COLUMNS.
+
+    Returns:
+    DataFrame: A new DataFrame with exactly the columns and dtypes of ACCOUNT_DTYPES.
+    """
+    invalid = pd.to_numeric(df['ac_id'].astype(object), errors='coerce').isna()
+    if invalid.any():
+        logging.error(f"Dropping {int(invalid.sum())} accounts without a valid id, account numbers: "
+                      f"{', '.join(str(ac_no) for ac_no in df.loc[invalid, 'ac_no'].tolist())}")
+        df = df[~invalid]
+
+    typed = pd.DataFrame(index=df.index)
+    for column in ACCOUNT_DTYPES:
+        typed[column] = cast_account_column(df[column], column)
+    return typed
+
+
+# Takes Series of values of an accounts column and returns it with the dtype of that column in ACCOUNT_DTYPES
+def cast_account_column(values, column):
+    dtype = ACCOUNT_DTYPES[column]
+    if column in ('ac_no', 'acc_holder_name', 'aslaas_no'):
+        values = values.astype(object).map(lambda value: None if pd.isna(value) else str(value))
+    elif column == 'acc_opening_date':
+        values = pd.to_datetime(values, errors='coerce')
+    elif column == 'is_active':
+        values = pd.to_numeric(values.astype(object), errors='coerce').round().astype('Int64')
+    else:
+        values = pd.to_numeric(values.astype(object), errors='coerce').round()
+        if dtype == 'int32':
+            values = values.astype('int64')
+    return values.astype(dtype)
+
+
+# Number of monthly installments of an RD account
+RD_TERM_MONTHS = 60
+
+# Default fee charged per defaulted installment for every 100 rupees of denomination
+DEFAULT_FEE_PER_100 = 1
+
+
+# Takes denomination, installments paid and months in arrears and returns the amount paid at the counter
+def payment_amount(denomination, installments, months_in_arrears):
+    """
+    Returns the cash needed to pay installments, the oldest first, so every paid installment
+    which was in arrears carries the default fee. Works on scalars and numpy arrays alike.
+
+    Args:
+    denomination: Monthly deposit of the account in rupees.
+    installments: Number of installments paid.
+    months_in_arrears: Number of installments of earlier months which are not paid.
+
+    Returns:
+    The amount in rupees including default fees.
+    """
+    defaulted = np.minimum(installments, months_in_arrears)
+    return installments * denomination + defaulted * denomination / 100 * DEFAULT_FEE_PER_100
+
+
+# Takes Series of dates and number of months and returns the dates shifted by those months, like pd.DateOffset(months=n)
+def add_months(dates, months):
+    """
+    Shifts every date by its own number of months in one vectorized pass.
+
+    The day of month is kept and clipped to the last day of the target month, as
+    pd.DateOffset(months=n) does for a single date.
+
+    Args:
+    dates (Series): Dates to shift, NaT stays NaT.
+    months (Series or int): Months to add, negative to subtract.
+
+    Returns:
+    Series: The shifted dates.
+    """
+    dates = pd.to_datetime(dates, errors='coerce')
+    month_index = dates.dt.year * 12 + dates.dt.month - 1 + months
+    first_days = pd.to_datetime(pd.DataFrame({
+        'year': month_index // 12,
+        'month': month_index % 12 + 1,
+        'day': 1
+    }), errors='coerce')
+    days = np.minimum(dates.dt.day, first_days.dt.days_in_month)
+    return first_days + pd.to_timedelta(days - 1, unit='D')
+
+
+# Takes accounts DataFrame and returns a copy for showing to the user with dates as text and blanks for missing values
+def to_display_frame(df):
+    display = df.reset_index(drop=True).astype(object)
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            display[column] = df[column].dt.strftime('%Y-%m-%d').reset_index(drop=True).astype(object)
+    return display.where(display.notna(), "")
+
+
+# Takes DataFrame and arrow schema and returns an arrow table with exactly that schema
+def to_arrow_table(df, schema):
+    arrays = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_date32(field.type):
+            timestamps = pa.array(pd.to_datetime(values, errors='coerce'), type=pa.timestamp('ns'), from_pandas=True)
+            arrays.append(pc.cast(timestamps, pa.date32(), safe=False))
+        elif pa.types.is_integer(field.type):
+            numbers = pd.to_numeric(values.astype(object), errors='coerce')
+            arrays.append(pa.array([None if pd.isna(value) else int(value) for value in numbers.tolist()], type=field.type))
+        else:
+            strings = pa.array([None if pd.isna(value) else str(value) for value in values.tolist()], type=pa.string())
+            arrays.append(strings.dictionary_encode() if pa.types.is_dictionary(field.type) else strings)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+# Takes path of a parquet file and returns it as DataFrame shaped like the same data read from csv
+def read_parquet_table(path):
+    # Memory mapping lets arrow read the columns without copying the file into a buffer first
+    df = pq.read_table(path, memory_map=True).to_pandas(date_as_object=False)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%d')
+    return df
+
+
+# Takes DataFrame, arrow schema and path and writes a parquet file which replaces the path atomically
+def write_parquet_table(df, schema, path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        pq.write_table(to_arrow_table(df, schema), file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+# Takes path of an RDRecord snapshot in csv or parquet format and returns it as DataFrame
+def read_snapshot(path):
+    if path.endswith('.parquet'):
+        return read_parquet_table(path)
+    return pd.read_csv(path, dtype={'ac_no': str})
+
+
+# Takes accounts DataFrame and returns a hash of its content
+def hash_snapshot(df):
+    rows = pd.util.hash_pandas_object(df[SNAPSHOT_COLUMNS].astype(str), index=False)
+    return hashlib.sha1(rows.values.tobytes()).hexdigest()
+
+
+# Index of RDRecord snapshots kept in a json lines file next to them, so lookups never scan the folder
+class SnapshotManifest:
+    def __init__(self, folder_name='RDRecord'):
+        """
+        Opens the manifest of a snapshot folder. Every entry records path, timestamp, row count
+        and content hash of one snapshot, in the order the snapshots were written.
+
+        Args:
+        folder_name (str, optional): Folder of the snapshots. Defaults to 'RDRecord'.
+        """
+        self.folder_name = folder_name
+        self.path = os.path.join(folder_name, 'manifest.jsonl')
+        self.entries = []
+        self.timestamps = []
+        self.signature = None
+
+    # Reads the manifest if it changed since it was last read, building it from the folder the first time
+    def load(self):
+        if not os.path.exists(self.path):
+            self.rebuild()
+        signature = file_signatures(self.path)
+        if signature == self.signature:
+            return
+
+        entries = []
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash during a write can only leave the last line incomplete
+                    logging.info(f"Skipping incomplete entry in {self.path}")
+        entries.sort(key=lambda entry: entry['timestamp'])
+        self.entries = entries
+        self.timestamps = [entry['timestamp'] for entry in entries]
+        self.signature = signature
+
+    # Builds the manifest of snapshots written before manifests existed, scanning the folder only this once
+    def rebuild(self):
+        files = glob.glob(os.path.join(self.folder_name, "RDRecord_*.csv")) + glob.glob(os.path.join(self.folder_name, "RDRecord_*.parquet"))
+        lines = []
+        for path in sorted(files, key=os.path.getmtime):
+            try:
+                df = read_snapshot(path)
+            except Exception as e:
+                logging.error(f"Skipping unreadable snapshot {path}: {e}")
+                continue
+            timestamp = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')
+            lines.append(json.dumps({'path': path, 'timestamp': timestamp, 'rows': len(df), 'hash': hash_snapshot(df)}) + "\n")
+
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        logging.info(f"Built snapshot manifest of {len(lines)} snapshots.")
+
+    # Takes entry of a new snapshot and durably appends it to the manifest
+    def append(self, entry):
+        self.load()
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    # Takes entries and returns the last one whose snapshot still exists
+    def last_existing(self, entries):
+        for entry in reversed(entries):
+            if os.path.exists(entry['path']):
+                return entry
+        return None
+
+    # Returns entry of the latest snapshot or None if there is none
+    def latest(self):
+        self.load()
+        return self.last_existing(self.entries)
+
+    # Takes datetime and returns entry of the latest snapshot written at or before it
+    def as_of(self, moment):
+        self.load()
+        end = bisect.bisect_right(self.timestamps, moment.isoformat(timespec='seconds'))
+        return self.last_existing(self.entries[:end])
+
+    # Takes two datetimes and returns entries of the snapshots written between them, both included
+    def between(self, start, end):
+        self.load()
+        first = bisect.bisect_left(self.timestamps, start.isoformat(timespec='seconds'))
+        last = bisect.bisect_right(self.timestamps, end.isoformat(timespec='seconds'))
+        return [entry for entry in self.entries[first:last] if os.path.exists(entry['path'])]
+
+
+# Takes accounts DataFrame scraped from the portal and saves it as a new RDRecord snapshot
+def write_snapshot(df, folder_name='RDRecord', storage_format='csv'):
+    """
+    Saves a snapshot of the accounts listed by the portal and records it in the manifest.
+
+    A snapshot with the same content as the latest one is not written again, the latest
+    snapshot is returned instead.
+
+    Args:
+    df (DataFrame): Accounts with the columns of SNAPSHOT_COLUMNS.
+    folder_name (str, optional): Folder of the snapshots. Defaults to 'RDRecord'.
+    storage_format (str, optional): 'csv' or 'parquet'. Defaults to 'csv'.
+
+    Returns:
+    str: Path of the saved snapshot, or of the latest snapshot if the content is unchanged.
+
+    Raises:
+    DatabaseError: If the storage format is unknown.
+    """
+    os.makedirs(folder_name, exist_ok=True)
+    manifest = SnapshotManifest(folder_name)
+    content_hash = hash_snapshot(df)
+    latest = manifest.latest()
+    if latest is not None and latest['hash'] == content_hash:
+        logging.info(f"Accounts are unchanged since snapshot {latest['path']}, not writing a new one.")
+        return latest['path']
+
+    # Generate file name with current timestamp
+    now = datetime.now()
+    date_stamp = now.strftime("%Y%m%d_%H%M%S")
+    if storage_format == 'parquet':
+        file_name = f"{folder_name}/RDRecord_{date_stamp}.parquet"
+        write_parquet_table(df, SNAPSHOT_SCHEMA, file_name)
+    elif storage_format == 'csv':
+        file_name = f"{folder_name}/RDRecord_{date_stamp}.csv"
+        df.to_csv(file_name, index=False)
+    else:
+        raise DatabaseError(f"Unknown snapshot format: {storage_format}")
+
+    manifest.append({'path': file_name, 'timestamp': now.isoformat(timespec='seconds'), 'rows': len(df), 'hash': content_hash})
+    return file_name
+
+
+# Takes DataFrame and returns its rows as tuples of plain python values for sqlite and json
+def to_python_rows(df, columns):
+    values = []
+    for column in columns:
+        values.append([None if pd.isna(value) else (value.strftime('%Y-%m-%d') if isinstance(value, pd.Timestamp) else value)
+                       for value in df[column].tolist()])
+    return list(zip(*values))
+
+
+# Takes file paths and returns their modification times and sizes, None for missing files
+def file_signatures(*paths):
+    signatures = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signatures.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signatures.append(None)
+    return tuple(signatures)
+
+
+# Stores the accounts table in a csv file and appends every write to a log which is folded into the csv in the background
+class CSVBackend:
+    # Size in bytes of the write log after which it is folded into the csv file
+    COMPACT_LOG_BYTES = 256 * 1024
+
+    def __init__(self, db_path='./Database/Database.csv'):
+        """
+        Opens the csv database and its write log.
+
+        Every write is appended to the log and fsynced, so it costs time proportional to its own
+        size. The log is replayed on load and folded into the csv file by a background thread
+        once it grows past COMPACT_LOG_BYTES. The csv file is only ever replaced by renaming a
+        completely written temporary file.
+
+        Args:
+        db_path (str, optional): Path of the csv database. Defaults to './Database/Database.csv'.
+        """
+        self.db_path = db_path
+        self.log_path = db_path + '.log'
+        # Log being folded into the csv, it is replayed too until the new csv is in place
+        self.compacting_log_path = db_path + '.log.compacting'
+        self.lock = threading.Lock()
+        self.compaction = None
+
+    # Returns modification time and size of the csv file and its logs, which change with every write
+    def signature(self):
+        return file_signatures(self.db_path, self.log_path, self.compacting_log_path)
+
+    # Returns the accounts table as stored in the csv file
+    def read_store(self):
+        return pd.read_csv(self.db_path, dtype={
+            'ac_no': str,
+            'ac_id': int
+        })
+
+    # Returns the whole accounts table with the write log applied
+    def load(self):
+        table = self.read_store()
+        table['aslaas_no'] = table['aslaas_no'].astype(object)
+        for path in (self.compacting_log_path, self.log_path):
+            table = self.replay_log(table, path)
+        return table
+
+    # Takes accounts table and log file path and returns the table with the logged writes applied
+    def replay_log(self, table, path):
+        if not os.path.exists(path):
+            return table
+
+        # Collect the final values of every written account, in order of first write
+        changes = {}
+        upserted = set()
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash during a write can only leave the last line incomplete
+                    logging.info(f"Skipping incomplete record in {path}")
+                    continue
+                if record['op'] == 'upsert':
+                    for values in record['rows']:
+                        row = dict(zip(ACCOUNT_COLUMNS, values))
+                        changes.setdefault(int(row['ac_id']), {}).update(row)
+                        upserted.add(int(row['ac_id']))
+                elif record['op'] == 'update':
+                    for ac_id, value in record['rows']:
+                        changes.setdefault(int(ac_id), {})[record['column']] = value
+        if not changes:
+            return table
+
+        table = table.reset_index(drop=True)
+        row_by_id = {int(ac_id): position for position, ac_id in enumerate(table['ac_id'].tolist()) if not pd.isna(ac_id)}
+        new_rows = []
+        for ac_id, values in changes.items():
+            position = row_by_id.get(ac_id)
+            if position is None:
+                # Only an upsert carries a whole account, an update of an unknown id has nothing to apply to
+                if ac_id in upserted:
+                    new_rows.append(values)
+                else:
+                    logging.error(f"Skipping logged update of unknown account id {ac_id} in {path}")
+                continue
+            for column, value in values.items():
+                table.iat[position, table.columns.get_loc(column)] = value
+        if new_rows:
+            table = pd.concat([table, pd.DataFrame(new_rows, columns=ACCOUNT_COLUMNS)], ignore_index=True)
+        logging.info(f"Replayed {len(changes)} account writes from {path}")
+        return table
+
+    # Takes log record and the whole accounts table after the write and durably appends the record
+    def append_log(self, record, table):
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.log_path, 'a') as file:
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+            log_size = os.path.getsize(self.log_path)
+        if log_size > self.COMPACT_LOG_BYTES:
+            self.start_compaction(table)
+
+    # Takes the whole accounts table and folds the write log into the csv file in a background thread
+    def start_compaction(self, table):
+        with self.lock:
+            if self.compaction is not None and self.compaction.is_alive():
+                return
+            if os.path.exists(self.compacting_log_path):
+                # A compaction was interrupted, keep its log until this one has replaced the csv
+                with open(self.log_path, 'r') as log_file, open(self.compacting_log_path, 'a') as compacting_file:
+                    compacting_file.write(log_file.read())
+                    compacting_file.flush()
+                    os.fsync(compacting_file.fileno())
+                os.remove(self.log_path)
+            else:
+                os.replace(self.log_path, self.compacting_log_path)
+            snapshot = table.copy()
+            self.compaction = threading.Thread(target=self.compact, args=(snapshot,), daemon=True)
+            self.compaction.start()
+
+    # Takes accounts table which contains every logged write and replaces the csv file with it
+    def compact(self, snapshot):
+        try:
+            self.write_atomic(snapshot)
+            os.remove(self.compacting_log_path)
+            logging.info("Compacted database write log.")
+        except Exception as e:
+            # The log is still replayed on load, so nothing is lost
+            logging.error(f"Error while compacting database write log: {e}")
+
+    # Waits until a running compaction has finished
+    def wait_for_compaction(self):
+        if self.compaction is not None:
+            self.compaction.join()
+
+    # Takes accounts table and writes it to a temporary file which is then renamed over the csv file
+    def write_atomic(self, table):
+        temp_path = self.db_path + '.tmp'
+        with open(temp_path, 'w', newline='') as file:
+            table[ACCOUNT_COLUMNS].to_csv(file, index=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.db_path)
+
+    # Takes the whole accounts table and stores it, dropping the write log
+    def replace_all(self, table):
+        self.wait_for_compaction()
+        with self.lock:
+            self.write_atomic(table)
+            for path in (self.log_path, self.compacting_log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    # Takes changed rows and the whole accounts table after the change and logs the rows
+    def upsert(self, rows, table):
+        self.append_log({'op': 'upsert', 'rows': to_python_rows(rows, ACCOUNT_COLUMNS)}, table)
+
+    # Takes column, changed rows and the whole accounts table after the change and logs the new values
+    def update_column(self, column, rows, table):
+        self.append_log({'op': 'update', 'column': column, 'rows': to_python_rows(rows, ['ac_id', column])}, table)
+
+
+# Stores the accounts table in a parquet file with the typed accounts schema, writes are logged like the csv backend
+class ParquetBackend(CSVBackend):
+    def __init__(self, db_path='./Database/Database.parquet', csv_path='./Database/Database.csv'):
+        """
+        Opens the parquet database, converting the csv database the first time.
+
+        Args:
+        db_path (str, optional): Path of the parquet database. Defaults to './Database/Database.parquet'.
+        csv_path (str, optional): Path of the csv database to convert. Defaults to './Database/Database.csv'.
+        """
+        super().__init__(db_path)
+        if not os.path.exists(db_path):
+            table = CSVBackend(csv_path).load() if os.path.exists(csv_path) else pd.DataFrame(columns=ACCOUNT_COLUMNS)
+            self.write_atomic(table)
+            logging.info(f"Converted {len(table)} accounts from {csv_path} to {db_path}")
+
+    # Returns the accounts table as stored in the parquet file
+    def read_store(self):
+        return read_parquet_table(self.db_path)
+
+    # Takes accounts table and writes it to a temporary file which is then renamed over the parquet file
+    def write_atomic(self, table):
+        write_parquet_table(table[ACCOUNT_COLUMNS], ACCOUNT_SCHEMA, self.db_path)
+
+
+# Stores the accounts table in sqlite with indexes, writes are transactions which only touch the given rows
+class SQLiteBackend:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            ac_id INTEGER PRIMARY KEY,
+            ac_no TEXT NOT NULL UNIQUE,
+            acc_holder_name TEXT,
+            denomination INTEGER,
+            acc_opening_date TEXT,
+            no_of_installments INTEGER,
+            is_active INTEGER,
+            aslaas_no TEXT
+        );
+        CREATE INDEX IF NOT EXISTS accounts_is_active ON accounts (is_active);
+        CREATE INDEX IF NOT EXISTS accounts_aslaas_no ON accounts (aslaas_no);
+    """
+
+    def __init__(self, db_path='./Database/Database.sqlite3', csv_path='./Database/Database.csv'):
+        """
+        Opens the sqlite database, creating its schema and migrating the csv database once.
+
+        ac_id is the primary key and ac_no has a unique index, is_active and aslaas_no are indexed.
+
+        Args:
+        db_path (str, optional): Path of the sqlite database. Defaults to './Database/Database.sqlite3'.
+        csv_path (str, optional): Path of the csv database to migrate. Defaults to './Database/Database.csv'.
+        """
+        self.db_path = db_path
+        # Workers of the GUI use the database from their own threads
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+        self.migrate_from_csv(csv_path)
+
+    # Copies the csv database into sqlite the first time the sqlite database is opened
+    def migrate_from_csv(self, csv_path):
+        with self.lock:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= 1:
+            return
+        table = CSVBackend(csv_path).load() if os.path.exists(csv_path) else pd.DataFrame(columns=ACCOUNT_COLUMNS)
+        table = self.drop_duplicate_accounts(table, csv_path)
+        rows = to_python_rows(table, ACCOUNT_COLUMNS)
+        with self.lock, self.connection:
+            self.connection.executemany(self.upsert_statement(), rows)
+            self.connection.execute("PRAGMA user_version = 1")
+        logging.info(f"Migrated {len(rows)} accounts from {csv_path} to {self.db_path}")
+
+    # Takes accounts table of the csv database and returns it without rows sqlite can not store
+    def drop_duplicate_accounts(self, table, csv_path):
+        """
+        Removes rows without account number and repeated account numbers, which older versions
+        could add to the csv database but violate the unique index of sqlite. The first row of
+        an account number is kept, the removed rows are logged and saved next to the database.
+
+        Args:
+        table (DataFrame): Accounts table of the csv database.
+        csv_path (str): Path of the csv database, the removed rows are saved beside it.
+
+        Returns:
+        DataFrame: The accounts table which can be migrated.
+        """
+        invalid = table['ac_no'].isna() | table['ac_id'].isna() | table.duplicated(subset=['ac_no'], keep='first')
+        if not invalid.any():
+            return table
+        dropped = table[invalid]
+        dropped_path = os.path.join(os.path.dirname(csv_path), 'migration_dropped_accounts.csv')
+        dropped.to_csv(dropped_path, index=False)
+        logging.error(f"Not migrating {len(dropped)} accounts with missing or repeated account numbers "
+                      f"(ids {', '.join(map(str, dropped['ac_id'].tolist()))}), saved them to {dropped_path}")
+        return table[~invalid]
+
+    # Returns modification time and size of the database file, which change with every commit
+    def signature(self):
+        return file_signatures(self.db_path, self.db_path + '-journal', self.db_path + '-wal')
+
+    # Returns statement which inserts an account or updates it if its ac_id exists
+    def upsert_statement(self):
+        columns = ', '.join(ACCOUNT_COLUMNS)
+        placeholders = ', '.join('?' for _ in ACCOUNT_COLUMNS)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in ACCOUNT_COLUMNS if column != 'ac_id')
+        return f"INSERT INTO accounts ({columns}) VALUES ({placeholders}) ON CONFLICT (ac_id) DO UPDATE SET {updates}"
+
+    # Returns the whole accounts table
+    def load(self):
+        with self.lock:
+            table = pd.read_sql_query(f"SELECT {', '.join(ACCOUNT_COLUMNS)} FROM accounts ORDER BY ac_id", self.connection)
+        table['ac_no'] = table['ac_no'].astype(str)
+        return table
+
+    # Takes the whole accounts table and stores it in one transaction
+    def replace_all(self, table):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM accounts")
+            self.connection.executemany(self.upsert_statement(), to_python_rows(table, ACCOUNT_COLUMNS))
+
+    # Takes changed rows and stores only them in one transaction
+    def upsert(self, rows, table):
+        with self.lock, self.connection:
+            self.connection.executemany(self.upsert_statement(), to_python_rows(rows, ACCOUNT_COLUMNS))
+
+    # Takes column and changed rows and updates only that column of those rows in one transaction
+    def update_column(self, column, rows, table):
+        with self.lock, self.connection:
+            self.connection.executemany(f"UPDATE accounts SET {column} = ? WHERE ac_id = ?", to_python_rows(rows, [column, 'ac_id']))
+
+
+# Persistent ledger of performed lots in sqlite, indexed by reference number, account and month
+class LotLedger:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lots (
+            ref_no TEXT PRIMARY KEY,
+            performed_at TEXT NOT NULL,
+            month TEXT NOT NULL,
+            accounts INTEGER NOT NULL,
+            installments INTEGER NOT NULL,
+            amount REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS lot_accounts (
+            ref_no TEXT NOT NULL REFERENCES lots (ref_no),
+            ac_no TEXT NOT NULL,
+            ac_id INTEGER,
+            installments INTEGER NOT NULL,
+            amount REAL,
+            month TEXT NOT NULL,
+            PRIMARY KEY (ref_no, ac_no)
+        );
+        CREATE INDEX IF NOT EXISTS lots_month ON lots (month, performed_at);
+        CREATE INDEX IF NOT EXISTS lots_performed_at ON lots (performed_at);
+        CREATE INDEX IF NOT EXISTS lot_accounts_ac_no ON lot_accounts (ac_no, month);
+        CREATE INDEX IF NOT EXISTS lot_accounts_ac_id ON lot_accounts (ac_id, month);
+    """
+
+    def __init__(self, db_path='./Database/LotLedger.sqlite3'):
+        """
+        Opens the lot ledger, creating its schema if required.
+
+        Every lot is stored once under its reference number with one row per account. Account
+        rows are indexed by account number, account id and month (YYYY-MM), so lookups never
+        scan the downloaded reports.
+
+        Args:
+        db_path (str, optional): Path of the ledger database. Defaults to './Database/LotLedger.sqlite3'.
+        """
+        self.db_path = db_path
+        # Workers of the GUI record lots from their own threads
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+    # Takes reference number and account rows of a paid lot and stores them in one transaction
+    def record_lot(self, ref_no, entries, performed_at=None):
+        """
+        Records a paid lot. Recording the same reference number again keeps the first record,
+        so a resumed lot is not counted twice.
+
+        Args:
+        ref_no (str): Reference number of the lot.
+        entries (list): One dict per account with keys ac_no, ac_id, installments and amount.
+        ac_id and amount are None for accounts which are not in the database.
+        performed_at (datetime, optional): Time of payment. Defaults to now.
+
+        Raises:
+        DatabaseError: If the lot could not be stored.
+        """
+        performed_at = performed_at or datetime.now()
+        month = performed_at.strftime('%Y-%m')
+        lot = (str(ref_no), performed_at.isoformat(timespec='seconds'), month, len(entries),
+               sum(int(entry['installments']) for entry in entries),
+               float(sum(entry['amount'] or 0 for entry in entries)))
+        rows = [(str(ref_no), str(entry['ac_no']), entry['ac_id'], int(entry['installments']), entry['amount'], month) for entry in entries]
+        try:
+            with self.lock, self.connection:
+                self.connection.execute("INSERT OR IGNORE INTO lots VALUES (?, ?, ?, ?, ?, ?)", lot)
+                self.connection.executemany("INSERT OR IGNORE INTO lot_accounts VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logging.error(f"Error while recording lot {ref_no}: {e}")
+            raise DatabaseError("Failed to record lot") from e
+        logging.info(f"Recorded lot {ref_no} of {len(entries)} accounts in the ledger.")
+
+    # Takes sql query and its parameters and returns the result as DataFrame
+    def query(self, sql, params=()):
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+    # Takes reference number and returns its account rows
+    def get_lot(self, ref_no):
+        return self.query("SELECT ac_id, ac_no, installments, amount FROM lot_accounts WHERE ref_no = ? ORDER BY rowid", (str(ref_no),))
+
+    # Returns most recent lots, newest first
+    def recent_lots(self, limit=50):
+        return self.query("SELECT ref_no, performed_at, accounts, installments, amount FROM lots ORDER BY performed_at DESC LIMIT ?", (int(limit),))
+
+    # Takes month (YYYY-MM) and returns all lots performed in it, newest first
+    def lots_for_month(self, month):
+        return self.query("SELECT ref_no, performed_at, accounts, installments, amount FROM lots WHERE month = ? ORDER BY performed_at DESC", (month,))
+
+    # Takes account number or id and optional month (YYYY-MM) and returns the lots which paid it
+    def lots_for_account(self, ac_no=None, ac_id=None, month=None):
+        column, value = ('ac_no', str(ac_no)) if ac_no is not None else ('ac_id', int(ac_id))
+        sql = f"""
+            SELECT la.ref_no, l.performed_at, la.ac_id, la.ac_no, la.installments, la.amount
+            FROM lot_accounts la JOIN lots l ON l.ref_no = la.ref_no
+            WHERE la.{column} = ?"""
+        params = [value]
+        if month:
+            sql += " AND la.month = ?"
+            params.append(month)
+        return self.query(sql + " ORDER BY l.performed_at DESC", params)
+
+    # Takes optional month (YYYY-MM) and returns lots, accounts, installments and amount per month
+    def monthly_totals(self, month=None):
+        sql = "SELECT month, COUNT(*) AS lots, SUM(accounts) AS accounts, SUM(installments) AS installments, SUM(amount) AS amount FROM lots"
+        params = []
+        if month:
+            sql += " WHERE month = ?"
+            params.append(month)
+        return self.query(sql + " GROUP BY month ORDER BY month DESC", params)
+
+
+# Takes name of the storage backend from settings, 'sqlite', 'csv' or 'parquet'
 class DOPDatabaseAssistant:
-    def __init__(self):
+    def __init__(self, backend='sqlite'):
         self.create_folder_if_not_exists('Database')
         self.create_folder_if_not_exists('RDRecord')
         self.db_path = './Database/Database.csv'
         self.initialize_database(self.db_path)
+        if backend == 'sqlite':
+            self.backend = SQLiteBackend(csv_path=self.db_path)
+        elif backend == 'parquet':
+            self.backend = ParquetBackend(csv_path=self.db_path)
+        elif backend == 'csv':
+            self.backend = CSVBackend(self.db_path)
+        else:
+            raise DatabaseError(f"Unknown database backend: {backend}")
         self.records_folder_path = './RDRecord/'
-        self.db = pd.read_csv(self.db_path, dtype={
-                'ac_no': str,
-                'ac_id': int
-            })
+        self.snapshot_manifest = SnapshotManifest(self.records_folder_path)
+        self.aslaas_report_path = './temp/aslaas_report.csv'
+        self.sync_state_path = './Database/sync_state.json'
+        self.provisional_path = './Database/provisional_installments.json'
+        # Columns of a snapshot which come from the portal and are compared between syncs
+        self.snapshot_columns = SNAPSHOT_COLUMNS
+        # Every read is served from the in-memory table, which is reloaded only when the storage changed
+        self.table_lock = threading.RLock()
+        self.cache_hits = 0
+        self.cache_misses = 1
+        self.set_table(self.backend.load())
+        self.ledger = LotLedger()
+
+    # Reloads the in-memory table if its storage was changed by someone else since it was loaded or written
+    def refresh(self):
+        with self.table_lock:
+            if self.backend.signature() == self.table_signature:
+                self.cache_hits += 1
+                return
+            self.cache_misses += 1
+            logging.info("Database changed on disk, reloading accounts table.")
+            self.set_table(self.backend.load())
+
+    # Returns number of reads served from memory and number of reloads of the accounts table
+    def cache_stats(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
         
+    # Takes accounts table and makes it the in-memory table with fresh indexes
+    def set_table(self, table):
+        self.table_signature = self.backend.signature()
+        self.db = apply_account_schema(table.reset_index(drop=True))
+        self.row_by_id = {}
+        self.row_by_no = {}
+        self.active_ids = set()
+        self.index_rows(0)
+
+    # Adds rows of the in-memory table from given position to the indexes
+    def index_rows(self, start):
+        rows = self.db.iloc[start:]
+        for position, ac_id, ac_no, is_active in zip(range(start, len(self.db)), rows['ac_id'].tolist(), rows['ac_no'].tolist(), rows['is_active'].tolist()):
+            self.row_by_id[int(ac_id)] = position
+            self.row_by_no[str(ac_no)] = position
+            if is_active == 1:
+                self.active_ids.add(int(ac_id))
+
+    # Takes list of account ids and returns positions of the known ones in input order
+    def rows_for_ids(self, acc_ids):
+        rows = []
+        for acc_id in acc_ids:
+            try:
+                row = self.row_by_id.get(int(acc_id))
+            except (TypeError, ValueError):
+                row = None
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    # Takes column name and mapping or DataFrame of account id to value and applies all of them in one operation
+    def bulk_update(self, column, values):
+        """
+        Updates one column of many accounts at once and stores only the rows whose value changed.
+
+        Args:
+        column (str): Column to update, any column except ac_id and ac_no.
+        values (dict or DataFrame): Account id to new value, or a DataFrame with ac_id and column.
+
+        Returns:
+        int: Number of rows which changed.
+
+        Raises:
+        DatabaseError: If the column can not be updated.
+        """
+        if column not in ACCOUNT_COLUMNS or column in ('ac_id', 'ac_no'):
+            raise DatabaseError(f"Column can not be bulk updated: {column}")
+        if isinstance(values, pd.DataFrame):
+            values = dict(zip(values['ac_id'].tolist(), values[column].tolist()))
+        # Values are cast like the loader does, so the column keeps its dtype whatever type the caller passed
+        typed = cast_account_column(pd.Series(list(values.values()), dtype=object), column).tolist()
+        values = dict(zip(values.keys(), typed))
+
+        # Positions are only valid for the table they were looked up in, so nothing may replace it meanwhile
+        with self.table_lock:
+            self.refresh()
+            current = self.db[column]
+            rows = []
+            new_values = []
+            for ac_id, value in values.items():
+                found = self.rows_for_ids([ac_id])
+                if not found:
+                    continue
+                row = found[0]
+                old_value = current.iat[row]
+                old_missing = pd.isna(old_value)
+                new_missing = pd.isna(value)
+                if (old_missing and new_missing) or (not old_missing and not new_missing and old_value == value):
+                    continue
+                rows.append(row)
+                new_values.append(value)
+            if not rows:
+                return 0
+
+            self.db.iloc[rows, self.db.columns.get_loc(column)] = new_values
+            self.backend.update_column(column, self.db.iloc[rows], self.db)
+            self.table_signature = self.backend.signature()
+
+            # Keep the active ids index in step with the status column
+            if column == 'is_active':
+                for row, value in zip(rows, new_values):
+                    ac_id = int(self.db['ac_id'].iat[row])
+                    if value == 1:
+                        self.active_ids.add(ac_id)
+                    else:
+                        self.active_ids.discard(ac_id)
+        return len(rows)
+
+    # Takes DataFrame of new accounts and adds them to the table and the indexes
+    def append_rows(self, rows):
+        rows = apply_account_schema(rows)
+        with self.table_lock:
+            start = len(self.db)
+            table = pd.concat([self.db, rows], ignore_index=True)
+            self.backend.upsert(rows, table)
+            self.table_signature = self.backend.signature()
+            self.db = table
+            self.index_rows(start)
+
+    # Checks whether given account id belongs to an active account
+    def is_active_account(self, acc_id):
+        self.refresh()
+        try:
+            return int(acc_id) in self.active_ids
+        except (TypeError, ValueError):
+            return False
+
     # Creates folder if folder of given name does not exist
     def create_folder_if_not_exists(self, folder_name):
         if not os.path.exists(folder_name):
@@ -45,94 +948,390 @@ class DOPDatabaseAssistant:
             # Save the DataFrame to the specified file path
             db.to_csv(db_path, index=False)
 
-    # Checks if there are any new accounts data in the records folder and then updates then in database
-    def sync_database_task(self):
+    # Checks the latest accounts snapshot in the records folder against the last synced one and merges only the differences
+    def sync_database_task(self, use_aslaas_report=True):
         try:
-            # Define the data types
-            data_types = {
-                'ac_no': str
+            self.refresh()
+            snapshot_path = self.find_latest_snapshot()
+            df = read_snapshot(snapshot_path)
+            logging.info("Reading and Processing of files Sucessful !")
+
+            # Only rows which differ from the last synced snapshot have to be merged
+            changed_df, closed_acc_nos = self.diff_snapshots(df, self.load_last_synced_snapshot(), self.db)
+
+            # Provisional installments written after lots are confirmed or corrected by the portal even if its row is unchanged
+            provisional = self.get_provisional_updates()
+            if provisional:
+                provisional_nos = [entry['ac_no'] for entry in provisional.values()]
+                pending = df[df['ac_no'].isin(provisional_nos) & ~df['ac_no'].isin(changed_df['ac_no'])]
+                changed_df = pd.concat([changed_df, pending], ignore_index=True)
+                self.log_provisional_results(provisional, df)
+            known = changed_df['ac_no'].isin(list(self.row_by_no))
+            new_accs = changed_df[~known].copy()
+            updated = changed_df[known]
+            changes = {
+                'new': len(new_accs),
+                'changed': len(updated),
+                'closed': len(closed_acc_nos)
             }
-            logging.info("Datatypes Defined Sucessful !")
+            logging.info(f"Snapshot differences: {changes}")
 
-            df = pd.read_csv(self.find_latest_csv(self.records_folder_path), dtype=data_types)
-            db = pd.read_csv(self.db_path, dtype={
-                'ac_no': str,
-                'ac_id':int
-            })
+            # Update installments and status of changed accounts and close accounts missing from the portal
+            ids = self.get_acc_ids_using_nos(updated['ac_no'].tolist())
+            self.bulk_update('no_of_installments', dict(zip(ids, updated['no_of_installments'].tolist())))
+            status = dict(zip(ids, updated['is_active'].tolist()))
+            status.update({ac_id: 0 for ac_id in self.get_acc_ids_using_nos(closed_acc_nos)})
+            self.bulk_update('is_active', status)
+            logging.info("Updating Old Data Sucessful !")
 
-            # Drop Specific columns from DataFrame
-            df2 = df.drop(columns=['acc_holder_name','denomination','acc_opening_date'],axis=1)
-            logging.info("Reading and Processing of files Sucessful !")
+            # Add new accounts with the next account ids
+            if len(new_accs):
+                last_ac_id = self.db['ac_id'].max()
+                last_ac_id = int(last_ac_id) if pd.notna(last_ac_id) else 0
+                new_accs['ac_id'] = list(range(last_ac_id + 1, last_ac_id + len(new_accs) + 1))
+                new_accs['aslaas_no'] = None
+                self.append_rows(new_accs[ACCOUNT_COLUMNS])
+                logging.info("Adding New Accounts Sucessful !")
 
-            db['no_of_installments'] = db['no_of_installments'].fillna(-1)
-            db['no_of_installments'] = db['no_of_installments'].astype(int)
+            if use_aslaas_report and os.path.exists(self.aslaas_report_path):
+                dtypes = {
+                    'ac_no' : str,
+                    'aslaas_no' : 'str'
+                }
 
-            # Perform left join and update values in 'Common1' and 'Common2' columns
-            db.set_index('ac_no', inplace=True)
-            df2.set_index('ac_no', inplace=True)
-            db.update(df2)
+                aslaas_data = pd.read_csv(self.aslaas_report_path, dtype=dtypes)
+                logging.info("Loading Aslaas Data Sucessful !")
 
-            
-            # Reset the index if needed
-            db.reset_index(inplace=True)
-            logging.info("Updating Old Data Sucessful !")
+                # Empty aslaas numbers in the report do not overwrite the database
+                aslaas_data = aslaas_data.dropna(subset=['aslaas_no'])
+                aslaas_data = aslaas_data[aslaas_data['ac_no'].isin(list(self.row_by_no))]
+                ids = self.get_acc_ids_using_nos(aslaas_data['ac_no'].tolist())
+                self.bulk_update('aslaas_no', dict(zip(ids, aslaas_data['aslaas_no'].tolist())))
+                logging.info("Updating Aslaas Data Sucessful !")
 
-            temp_df = db[['ac_id','ac_no','aslaas_no']]
-            merged_df = pd.merge(df,temp_df, how='left', on='ac_no')
-            new_accs = merged_df[merged_df['ac_id'].isna()]
-            last_ac_id = db['ac_id'].max()
-            if pd.notna(last_ac_id):
-                last_ac_id = int(last_ac_id)
-            else:
-                last_ac_id = 0
-            new_accs.loc[:, 'ac_id'] = new_accs.loc[:, 'ac_id'].fillna(-1)
-            new_accs.loc[:, 'ac_id'] = new_accs.loc[:, 'ac_id'].astype(int)
-            new_accs.loc[:, 'ac_id'] = list(range(int(last_ac_id)+1, int(last_ac_id) + len(new_accs)+1))
-            final_db = pd.concat([db, new_accs])
-            final_db.loc[:, 'ac_id'] = final_db.loc[:, 'ac_id'].astype(int)
-            
-            dtypes = {
-                'ac_no' : str,
-                'aslaas_no' : 'str'
-            }
-            
-            aslaas_data = pd.read_csv('./temp/aslaas_report.csv', dtype=dtypes)
-            logging.info("Loading Aslaas Data Sucessful !")
-            
-            #database = final_db.merge(aslaas_data, how="left", on="ac_no")
-            final_db.set_index('ac_no', inplace=True)
-            aslaas_data.set_index('ac_no', inplace=True)
-            
-            final_db.update(aslaas_data)
-            final_db.reset_index(inplace=True)
-            
-            logging.info("Merging Sucessful!")
-            # Update aslaas_no in df1 based on merged_df
-            #final_db["aslaas_no"] = final_db["aslaas_no"].fillna(database["aslaas_no_y"])
-            logging.info("Updating Aslaas Data Sucessful !")
-            
-            final_db.to_csv(self.db_path, index=False)
-            logging.info("Database Save Sucessful !")
+            self.save_sync_state(snapshot_path)
+            self.clear_provisional_updates()
+            return changes
 
         except Exception as e:
             logging.error(f"Error During Database Update : {e}")
             raise UpdateTaskError(f"Error during Updating Database: {e}")
 
-    # Finds the latest csv file in a directory 
-    def find_latest_csv(self,directory):
-        # Get list of all CSV files in directory
-        files = glob.glob(os.path.join(directory, "*.csv"))
-        # Return the file with the latest modification time
-        return max(files, key=os.path.getmtime)
+    # Takes account numbers, installments and reference number of a paid lot and adds the installments to the database
+    def apply_paid_installments(self, acc_nos, no_installments, ref_no):
+        """
+        Writes the installments paid by a lot through to the database in one bulk update and
+        marks the changed accounts as provisional until the next sync confirms them.
+
+        A lot is applied only once per account, so calling it again for a resumed lot with the
+        same reference number changes nothing.
+
+        Args:
+        acc_nos (list): Account numbers of the lot.
+        no_installments (list): Number of installments paid for each account.
+        ref_no (str): Reference number of the lot.
+
+        Returns:
+        int: Number of accounts which were updated.
+
+        Raises:
+        UpdateTaskError: If the database could not be updated.
+        """
+        try:
+            with self.table_lock:
+                self.refresh()
+                provisional = self.get_provisional_updates()
+                ac_ids = self.db['ac_id']
+                installments = self.db['no_of_installments']
+                values = {}
+                for acc_no, paid in zip(acc_nos, no_installments):
+                    row = self.row_by_no.get(str(acc_no))
+                    if row is None:
+                        continue
+                    ac_id = int(ac_ids.iat[row])
+                    current = installments.iat[row]
+                    current = 0 if pd.isna(current) else int(current)
+                    entry = provisional.setdefault(str(ac_id), {'ac_no': str(acc_no), 'confirmed': current, 'installments': current, 'ref_nos': []})
+                    if str(ref_no) in entry['ref_nos']:
+                        continue
+                    entry['installments'] = current + int(paid)
+                    entry['ref_nos'].append(str(ref_no))
+                    values[ac_id] = entry['installments']
+
+                self.bulk_update('no_of_installments', values)
+                self.save_provisional_updates(provisional)
+            logging.info(f"Applied installments of lot {ref_no} to {len(values)} accounts provisionally.")
+            return len(values)
+        except Exception as e:
+            logging.error(f"Error while applying installments of lot {ref_no}: {e}")
+            raise UpdateTaskError("Failed to apply paid installments") from e
+
+    # Returns provisional installments by account id, with account number, confirmed and provisional count and lots
+    def get_provisional_updates(self):
+        if not os.path.exists(self.provisional_path):
+            return {}
+        try:
+            with open(self.provisional_path, 'r') as file:
+                return json.load(file)
+        except Exception as e:
+            logging.error(f"Error while reading provisional installments: {e}")
+            return {}
+
+    # Takes provisional installments and stores them using a temporary file and atomic rename
+    def save_provisional_updates(self, provisional):
+        temp_path = self.provisional_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(provisional, file)
+        os.replace(temp_path, self.provisional_path)
+
+    # Removes provisional installments once a sync has replaced them with the portal values
+    def clear_provisional_updates(self):
+        if os.path.exists(self.provisional_path):
+            os.remove(self.provisional_path)
+
+    # Takes provisional installments and new snapshot and logs the accounts where the portal disagrees
+    def log_provisional_results(self, provisional, df):
+        portal_installments = dict(zip(df['ac_no'].astype(str).tolist(), df['no_of_installments'].tolist()))
+        mismatched = [entry['ac_no'] for entry in provisional.values()
+                      if entry['ac_no'] in portal_installments and not pd.isna(portal_installments[entry['ac_no']])
+                      and int(portal_installments[entry['ac_no']]) != entry['installments']]
+        logging.info(f"Sync confirms provisional installments of {len(provisional) - len(mismatched)} accounts.")
+        if mismatched:
+            logging.info(f"Portal installments differ from provisional ones for accounts: {', '.join(mismatched)}")
+
+    # Returns hash of every row of accounts DataFrame over the columns taken from the portal
+    def hash_snapshot_rows(self, df):
+        rows = df[self.snapshot_columns].astype(str)
+        return pd.Series(pd.util.hash_pandas_object(rows, index=False).values, index=df['ac_no'])
+
+    # Takes new snapshot, last synced snapshot and database and returns changed rows and closed account numbers
+    def diff_snapshots(self, df, previous_df, db):
+        # Without a synced snapshot, or with accounts missing from the database, every row is compared as changed
+        if previous_df is None or not set(previous_df['ac_no']).issubset(set(db['ac_no'])):
+            return df, []
+
+        new_hashes = self.hash_snapshot_rows(df)
+        old_hashes = self.hash_snapshot_rows(previous_df)
+        old_hashes = old_hashes.reindex(new_hashes.index)
+        changed_df = df[(new_hashes.values != old_hashes.values) | old_hashes.isna().values]
+
+        # Accounts which are no longer listed by the portal are closed
+        closed_acc_nos = sorted(set(previous_df['ac_no']) - set(df['ac_no']))
+        return changed_df, closed_acc_nos
+
+    # Returns the snapshot merged by the last successful sync or None if there is none
+    def load_last_synced_snapshot(self):
+        if not os.path.exists(self.sync_state_path):
+            return None
+        try:
+            with open(self.sync_state_path, 'r') as file:
+                snapshot_path = json.load(file).get('snapshot')
+            if not snapshot_path or not os.path.exists(snapshot_path):
+                return None
+            return read_snapshot(snapshot_path)
+        except Exception as e:
+            logging.error(f"Error while reading last synced snapshot: {e}")
+            return None
+
+    # Records the snapshot merged by a successful sync
+    def save_sync_state(self, snapshot_path):
+        temp_path = self.sync_state_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'snapshot': snapshot_path, 'synced_at': datetime.now().isoformat(timespec='seconds')}, file)
+        os.replace(temp_path, self.sync_state_path)
+
+    # Checks whether the ASLAAS report is needed, i.e. some active or newly listed account has no aslaas number
+    def needs_aslaas_report(self):
+        try:
+            self.refresh()
+            if self.get_ac_nos_without_aslaas():
+                return True
+            df = read_snapshot(self.find_latest_snapshot())
+            return any(ac_no not in self.row_by_no for ac_no in df['ac_no'])
+        except Exception as e:
+            logging.error(f"Error During Database Task : {e}")
+            return True
+
+    # Finds the latest snapshot using the manifest of the records folder
+    def find_latest_snapshot(self):
+        entry = self.snapshot_manifest.latest()
+        if entry is None:
+            raise DatabaseError("No accounts snapshot found")
+        return entry['path']
+
+    # Finds the latest snapshot taken at or before given datetime
+    def find_snapshot_as_of(self, moment):
+        entry = self.snapshot_manifest.as_of(moment)
+        if entry is None:
+            raise DatabaseError(f"No accounts snapshot found before {moment}")
+        return entry['path']
+
+    # Finds all snapshots taken between two datetimes
+    def find_snapshots_between(self, start, end):
+        return [entry['path'] for entry in self.snapshot_manifest.between(start, end)]
     
-    # Gets all account numbers which do not have a aslaas number
-    def get_ac_nos_without_aslaas(self):
+    # Computes due dates, arrears, default fees and amounts due of all accounts in one vectorized pass
+    def compute_dues(self, as_of=None):
+        """
+        Computes the position of every account of the portfolio on a date.
+
+        An account opened on or before the 15th is due by the 15th of each month, later
+        openings are due by the end of the month. Installments of months before the current
+        one which are not paid are in arrears and carry a default fee of DEFAULT_FEE_PER_100
+        per 100 rupees of denomination each.
+
+        Args:
+        as_of (datetime, optional): Date of the computation. Defaults to now.
+
+        Returns:
+        DataFrame: One row per account with ac_id, ac_no, acc_holder_name, denomination,
+        no_of_installments, is_active, next_due_date, months_in_arrears, installments_due,
+        default_fee, maturity_date and amount_due. installments_due counts the installments
+        needed to be up to date including the current month.
+
+        Raises:
+        DatabaseError: If the dues could not be computed.
+        """
         try:
-            db = pd.read_csv(self.db_path, dtype={
-                'ac_no': str,
-                'ac_id':int
+            self.refresh()
+            as_of = pd.Timestamp(as_of or datetime.now())
+            db = self.db
+            paid = db['no_of_installments'].astype('float64').fillna(0).to_numpy()
+            denomination = db['denomination'].astype('float64').fillna(0).to_numpy()
+            opening = db['acc_opening_date']
+
+            # Months counted from year 0, so month differences are plain subtractions
+            opening_month = (opening.dt.year * 12 + opening.dt.month - 1).to_numpy(dtype='float64')
+            current_month = as_of.year * 12 + as_of.month - 1
+            next_due_month = opening_month + paid
+            remaining = np.maximum(RD_TERM_MONTHS - paid, 0)
+
+            months_in_arrears = np.nan_to_num(np.clip(current_month - next_due_month, 0, remaining))
+            installments_due = np.nan_to_num(np.clip(current_month - next_due_month + 1, 0, remaining))
+            default_fee = months_in_arrears * denomination / 100 * DEFAULT_FEE_PER_100
+            # Accounts without an opening date can not be scheduled
+            active = ((db['is_active'] == 1) & opening.notna()).to_numpy()
+
+            # The due day is the 15th for accounts opened up to the 15th and the month end otherwise
+            next_due_first = add_months(opening.dt.to_period('M').dt.to_timestamp(), pd.Series(paid, index=db.index).astype(int))
+            next_due_date = next_due_first.where(opening.dt.day > 15, next_due_first + pd.Timedelta(days=14))
+            next_due_date = next_due_date.where(opening.dt.day <= 15, next_due_first + pd.offsets.MonthEnd(0))
+
+            dues = pd.DataFrame({
+                'ac_id': db['ac_id'],
+                'ac_no': db['ac_no'],
+                'acc_holder_name': db['acc_holder_name'],
+                'denomination': db['denomination'],
+                'no_of_installments': db['no_of_installments'],
+                'is_active': db['is_active'],
+                'next_due_date': next_due_date.where(remaining > 0),
+                'months_in_arrears': np.where(active, months_in_arrears, 0).astype('int32'),
+                'installments_due': np.where(active, installments_due, 0).astype('int32'),
+                'default_fee': np.where(active, default_fee, 0),
+                'maturity_date': add_months(opening, RD_TERM_MONTHS),
             })
+            dues['amount_due'] = payment_amount(denomination, dues['installments_due'].to_numpy(), dues['months_in_arrears'].to_numpy())
+            return dues
+        except Exception as e:
+            logging.error(f"Error occurred while computing dues: {e}")
+            raise DatabaseError("Failed to compute dues") from e
+
+    # Returns active accounts with installments due as list of 'id-installments' tokens for the workspace
+    def get_due_account_tokens(self, as_of=None):
+        dues = self.compute_dues(as_of)
+        dues = dues[dues['installments_due'] > 0]
+        return [f"{ac_id}-{installments}" for ac_id, installments in zip(dues['ac_id'].tolist(), dues['installments_due'].tolist())]
+
+    # Groups all due active accounts into lots which respect the portal limits
+    def plan_lots(self, max_lot_accounts=50, cash_limit=0, page_size=10, as_of=None):
+        """
+        Plans the LOTs which pay every installment due, ready to run one by one.
+
+        Accounts with more than one installment due come first, so their installments are
+        edited on the first pages of the first LOTs and the other LOTs need no pager walk for
+        editing. LOTs are filled up to max_lot_accounts, rounded down to whole pages, and up
+        to cash_limit rupees. An account whose amount alone exceeds the cash limit gets a LOT
+        of its own.
+
+        Args:
+        max_lot_accounts (int, optional): Maximum number of accounts in a LOT. Defaults to 50.
+        cash_limit (int, optional): Maximum amount in rupees of a LOT, 0 for no limit. Defaults to 0.
+        page_size (int, optional): Accounts per page of the portal tables. Defaults to 10.
+        as_of (datetime, optional): Date of the plan. Defaults to now.
+
+        Returns:
+        dict: lots, a list of dicts with index, ac_ids, ac_nos, installments, accounts and amount,
+        and the totals accounts, installments and amount of the plan.
+        """
+        dues = self.compute_dues(as_of)
+        dues = dues[dues['installments_due'] > 0]
+        dues = dues.assign(multi=dues['installments_due'] > 1).sort_values(['multi', 'ac_id'], ascending=[False, True])
+
+        max_lot_accounts = max(1, int(max_lot_accounts))
+        if max_lot_accounts >= page_size:
+            max_lot_accounts -= max_lot_accounts % page_size
+        cash_limit = float(cash_limit or 0)
+
+        # Amounts include default fees, as they are paid at the counter with the installments
+        amounts = dues['amount_due'].astype('float64').tolist()
+        lots = []
+        current = None
+        for ac_id, ac_no, installments, amount in zip(dues['ac_id'].tolist(), dues['ac_no'].tolist(), dues['installments_due'].tolist(), amounts):
+            if (current is None or len(current['ac_ids']) >= max_lot_accounts
+                    or (cash_limit and current['amount'] + amount > cash_limit and current['ac_ids'])):
+                current = {'index': len(lots), 'ac_ids': [], 'ac_nos': [], 'installments': [], 'accounts': 0, 'amount': 0.0}
+                lots.append(current)
+            current['ac_ids'].append(int(ac_id))
+            current['ac_nos'].append(str(ac_no))
+            current['installments'].append(int(installments))
+            current['accounts'] += 1
+            current['amount'] += amount
 
+        return {
+            'lots': lots,
+            'accounts': len(dues),
+            'installments': int(dues['installments_due'].sum()),
+            'amount': float(sum(amounts))
+        }
+
+    # Takes reference number, account numbers and installments of a paid lot and records it in the ledger
+    def record_lot(self, ref_no, acc_nos, no_installments, performed_at=None):
+        try:
+            # Amounts are priced like plan_lots, with the arrears before the lot is applied to the database
+            dues = self.compute_dues(performed_at)
+            ac_ids = dues['ac_id']
+            denominations = dues['denomination']
+            arrears = dues['months_in_arrears']
+            entries = []
+            for acc_no, installments in zip(acc_nos, no_installments):
+                row = self.row_by_no.get(str(acc_no))
+                denomination = denominations.iat[row] if row is not None else None
+                known = denomination is not None and not pd.isna(denomination)
+                entries.append({
+                    'ac_no': str(acc_no),
+                    'ac_id': int(ac_ids.iat[row]) if row is not None else None,
+                    'installments': int(installments),
+                    'amount': float(payment_amount(float(denomination), int(installments), int(arrears.iat[row]))) if known else None
+                })
+            self.ledger.record_lot(ref_no, entries, performed_at)
+        except Exception as e:
+            logging.error(f"Error occurred while recording lot {ref_no}: {e}")
+            raise DatabaseError("Failed to record lot") from e
+
+    # Takes file path and exports the accounts table to it as csv
+    def export_csv(self, file_path):
+        try:
+            self.refresh()
+            self.db[ACCOUNT_COLUMNS].to_csv(file_path, index=False)
+        except Exception as e:
+            logging.error(f"Error occurred while exporting accounts: {e}")
+            raise DatabaseError("Failed to export accounts") from e
+
+    # Gets all account numbers which do not have a aslaas number
+    def get_ac_nos_without_aslaas(self):
+        try:
+            self.refresh()
+            db = self.db
             db = db[db['is_active']==1]
 
             acc_nos = db[db.aslaas_no.isnull()]['ac_no'].tolist()
@@ -145,18 +1344,12 @@ class DOPDatabaseAssistant:
     # Gets Data of all accounts for seeing all accounts page
     def get_all_accounts(self):
         try:
-            db = pd.read_csv(self.db_path, dtype={
-                'ac_no': str,
-                'ac_id': int
-            })
-
+            self.refresh()
             #Change isActive column info for user Convienence
-            all_accounts = db
-            all_accounts['is_active'] = all_accounts['is_active'].astype(str)
-            all_accounts.loc[(all_accounts.loc[:,'is_active']).astype(str)=='1', 'is_active'] = "Active"
-            all_accounts.loc[(all_accounts.loc[:,'is_active']).astype(str)=='0', 'is_active'] = "Closed"
+            all_accounts = self.db.copy()
+            all_accounts['is_active'] = all_accounts['is_active'].cat.rename_categories({1: "Active", 0: "Closed"})
 
-            return all_accounts
+            return to_display_frame(all_accounts)
 
         except Exception as e:
             logging.error(f"Error occurred while getting all accounts: {e}")
@@ -165,7 +1358,9 @@ class DOPDatabaseAssistant:
     # Gets account numbers using the ids array
     def get_acc_nos_using_ids(self, acc_ids):
         try:
-            acc_nos = self.db[self.db['ac_id'].astype(str).isin(acc_ids)]['ac_no'].astype(str).tolist()
+            self.refresh()
+            ac_nos = self.db['ac_no']
+            acc_nos = [str(ac_nos.iat[row]) for row in self.rows_for_ids(acc_ids)]
             return acc_nos
         except Exception as e:
             logging.error(f"Error occurred while getting account Numbers: {e}")
@@ -174,7 +1369,8 @@ class DOPDatabaseAssistant:
     # Fetch all account ids of active accounts
     def get_list_of_active_account_ids(self):
         try:
-            active_acc_ids = self.db[self.db['is_active']==1]['ac_id'].astype(str).tolist()
+            self.refresh()
+            active_acc_ids = [str(ac_id) for ac_id in sorted(self.active_ids)]
             return active_acc_ids
         except Exception as e :
             logging.error(f"Error occurred while getting active account ID's: {e}")
@@ -183,7 +1379,8 @@ class DOPDatabaseAssistant:
     # Gets details of specific accounts using their ids list
     def get_ac_details_by_ids(self,acc_ids):
         try:
-            acc_details = self.db[self.db['ac_id'].isin(acc_ids)]
+            self.refresh()
+            acc_details = self.db.iloc[self.rows_for_ids(acc_ids)]
             acc_details = acc_details.drop(columns=['no_of_installments','is_active','aslaas_no'], axis = 1)
             return acc_details
         except Exception as e:
@@ -193,9 +1390,10 @@ class DOPDatabaseAssistant:
     # Get data of accounts using id list
     def get_data_for_declaration(self, acc_ids):
         try:
-            acc_details = self.db[self.db['ac_id'].isin(acc_ids)]
+            self.refresh()
+            acc_details = self.db.iloc[self.rows_for_ids(acc_ids)]
             acc_details = acc_details.drop(columns=['ac_id','no_of_installments','is_active','aslaas_no'], axis = 1)
-            return acc_details
+            return to_display_frame(acc_details)
         except Exception as e:
             logging.error(f"Error occurred while getting account Numbers: {e}")
             raise DatabaseError("Failed to retrieve accounts") from e  # Re-raise with a more specific message
@@ -203,9 +1401,12 @@ class DOPDatabaseAssistant:
     # Method to add an account to database using account details array 
     def add_account_to_database(self, acc_details):
         try:
-            acc_id = len(self.db.index)
-            self.db.loc[acc_id] = [str(acc_details[0]),int(acc_id+1),acc_details[1],acc_details[2],acc_details[3],acc_details[4],acc_details[5],acc_details[6]]
-            self.db.to_csv(self.db_path, index=False)
+            self.refresh()
+            # Next id after the largest one, a count of rows could reuse an id when ids have gaps
+            last_ac_id = self.db['ac_id'].max()
+            acc_id = int(last_ac_id) if pd.notna(last_ac_id) else 0
+            row = pd.DataFrame([[str(acc_details[0]),int(acc_id+1),acc_details[1],acc_details[2],acc_details[3],acc_details[4],acc_details[5],acc_details[6]]], columns=ACCOUNT_COLUMNS)
+            self.append_rows(row)
         except Exception as e:
             logging.error(f"Error occurred while adding account: {e}")
             raise DatabaseError("Failed to add account") from e  # Re-raise with a more specific message
@@ -214,18 +1415,16 @@ class DOPDatabaseAssistant:
     # Update aslaas numbers in the database for fixed given number of accounts and given aslaas numbers
     def sync_aslaas_numbers(self, acc_ids, aslaas_nos):
         try:
-            for i in range(len(acc_ids)):
-                account_id = int(acc_ids[i])
-                self.db.loc[self.db['ac_id'] == account_id, 'aslaas_no'] = str(aslaas_nos[i])
-                    
-            self.db.to_csv(self.db_path, index=False)
+            self.bulk_update('aslaas_no', {int(acc_ids[i]): str(aslaas_nos[i]) for i in range(len(acc_ids))})
         except Exception as e:
             logging.error(f"Error Occurred During Updating Database : {e}")
             raise UpdateTaskError("Failed to Update Data") from e
 
     def get_acc_ids_using_nos(self, acc_nos):
         try:
-            acc_ids = self.db[self.db['ac_no'].isin(acc_nos)]['ac_id'].astype(int).tolist()
+            self.refresh()
+            ac_ids = self.db['ac_id']
+            acc_ids = [int(ac_ids.iat[self.row_by_no[str(acc_no)]]) for acc_no in acc_nos if str(acc_no) in self.row_by_no]
             return acc_ids
         except Exception as e:
             logging.error(f"Error occurred while getting account IDs: {e}")
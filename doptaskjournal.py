@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+
+# Configure the logging settings
+logging.basicConfig(filename='doplogs.log' ,level=20, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# Custom Error Class
+class JournalError(Exception):
+    pass
+
+
+# Durable append-only journal of the steps of a long running task
+class TaskJournal:
+    def __init__(self, task_name, journal_dir='Journal'):
+        """
+        Opens the journal of a task, creating the journal folder if required.
+
+        Every record is a JSON line which is flushed and fsynced before append returns, so a
+        record that exists survives a crash or power cut of the application.
+
+        Args:
+        task_name (str): Name of the task, used as the journal file name.
+        journal_dir (str, optional): Folder where journals are stored. Defaults to 'Journal'.
+        """
+        os.makedirs(journal_dir, exist_ok=True)
+        self.path = os.path.join(journal_dir, f"{task_name}.jsonl")
+        self.lock = threading.Lock()
+
+
+    # Takes step name and its data and durably appends it to the journal
+    def append(self, step, **data):
+        """
+        Appends a record to the journal and waits until it is on disk.
+
+        Args:
+        step (str): Name of the completed step.
+        **data: JSON serializable details of the step.
+
+        Raises:
+        JournalError: If the record could not be written.
+        """
+        record = {'step': step, 'time': datetime.now().isoformat(timespec='seconds'), **data}
+        line = json.dumps(record) + "\n"
+        try:
+            with self.lock:
+                with open(self.path, 'a') as file:
+                    file.write(line)
+                    file.flush()
+                    os.fsync(file.fileno())
+        except OSError as e:
+            logging.error(f"Error while writing journal {self.path}: {e}")
+            raise JournalError("Failed to write task journal") from e
+
+
+    # Returns list of records of the journal, optionally only of one step
+    def records(self, step=None):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with self.lock:
+            with open(self.path, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash during a write can only leave the last line incomplete
+                        logging.info(f"Skipping incomplete record in journal {self.path}")
+                        continue
+                    if step is None or record.get('step') == step:
+                        records.append(record)
+        return records
+
+
+    # Returns the last record of the journal or None if it is empty
+    def last(self, step=None):
+        records = self.records(step)
+        return records[-1] if records else None
+
+
+    # Returns the datetime of the first record or None if the journal is empty
+    def started(self):
+        records = self.records()
+        return datetime.fromisoformat(records[0]['time']) if records else None
+
+
+    # Takes age in hours and clears the journal if it was started before that, returns True if cleared
+    def expire(self, max_hours):
+        started = self.started()
+        if started is None or (datetime.now() - started).total_seconds() <= max_hours * 3600:
+            return False
+        logging.info(f"Discarding journal {self.path} started at {started}")
+        self.clear()
+        return True
+
+
+    # Removes the journal once its task has completed
+    def clear(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# Takes task name and its inputs and returns the journal of exactly that task
+def journal_for(task_name, *inputs, journal_dir='Journal'):
+    """
+    Returns the journal of a task identified by its inputs, so an interrupted task is only
+    resumed when it is started again with the same inputs.
+
+    Args:
+    task_name (str): Name of the task.
+    *inputs: JSON serializable inputs of the task, e.g. account numbers and installments.
+    journal_dir (str, optional): Folder where journals are stored. Defaults to 'Journal'.
+
+    Returns:
+    TaskJournal: The journal of the task.
+    """
+    digest = hashlib.sha1(json.dumps([list(map(str, values)) for values in inputs]).encode()).hexdigest()[:12]
+    return TaskJournal(f"{task_name}_{digest}", journal_dir)
@@ -1,21 +1,26 @@
 import os
-import io
-import glob
+import sys
+import select
+import ctypes
+import ctypes.util
+import itertools
 import shutil
 import json
 import time
 import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 import pandas as pd
 import requests
-from PIL import Image, ImageFilter
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.select import Select
 from selenium.common.exceptions import (
-    NoSuchElementException, WebDriverException
+    NoSuchElementException, WebDriverException, TimeoutException
 )
 
 from selenium.webdriver.support.ui import WebDriverWait
@@ -36,6 +41,18 @@ from selenium.webdriver.firefox.service import Service as FirefoxService
 
 import browsers
 
+# Windows change notifications for the download watcher, polling is used where they are not available
+try:
+    import win32con
+    import win32event
+    import win32file
+except ImportError:
+    win32file = None
+
+from dopcaptchaassistant import create_captcha_engine
+from doptaskjournal import journal_for
+from dopdatabaseassistant import write_snapshot, add_months
+
 
 
 # Configure the logging settings
@@ -77,12 +94,93 @@ class NoSupportedBrowserFound(Exception):
 
 # DOPWebAssistant class to perform tasks on web portal of DOP agent indiapost
 class DOPWebAssistant:
-    def __init__(self):
+    # Script which returns index and account number of rows on current page of selected accounts table
+    SELECTED_ACCOUNTS_SCRIPT = """
+        var prefix = 'HREF_CustomAgentRDAccountFG.ACCOUNT_NUMBER_ARRAY[';
+        var cells = document.querySelectorAll('[id^="' + prefix + '"]');
+        var rows = [];
+        for (var i = 0; i < cells.length; i++) {
+            var index = parseInt(cells[i].id.substring(prefix.length), 10);
+            rows.push([index, cells[i].innerText.trim()]);
+        }
+        return rows;
+    """
+
+    # Driver managers of supported browsers in order of preference
+    DRIVER_MANAGERS = {
+        'firefox': GeckoDriverManager,
+        'chrome': ChromeDriverManager,
+        'msedge': EdgeChromiumDriverManager
+    }
+
+    # ASLAAS report read by the database sync
+    ASLAAS_REPORT_PATH = os.path.join('temp', 'aslaas_report.csv')
+
+    # File where resolved browser and driver paths are cached
+    DRIVER_CACHE_PATH = 'driver_cache.json'
+
+    # Window size used by the performance profile instead of a maximized window
+    PERFORMANCE_WINDOW_SIZE = (1280, 900)
+
+    # Static resources blocked by the performance profile, fonts always and images once logged in, the
+    # login page with its captcha loads images since the captcha URL is not known to be free of these extensions
+    PERFORMANCE_BLOCKED_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+    PERFORMANCE_BLOCKED_IMAGE_URLS = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"]
+
+    # Script which returns action, method and fields of the form submitted by the given button
+    FORM_SCRIPT = """
+        var button = document.getElementById(arguments[0]);
+        var form = button.form;
+        var fields = [];
+        new FormData(form).forEach(function (value, key) {
+            if (typeof value === 'string') {
+                fields.push([key, value]);
+            }
+        });
+        if (button.name) {
+            fields.push([button.name, button.value]);
+        }
+        return {action: form.action, method: (form.method || 'post').toUpperCase(), fields: fields};
+    """
+
+    # Default timeouts in seconds of each kind of wait, can be tuned with wait_timeouts in settings.json
+    DEFAULT_WAIT_TIMEOUTS = {
+        'element': 20,          # Element to be present or clickable
+        'overlay': 30,          # blockUI overlay to disappear
+        'new_window': 30,       # Print preview tab to open
+        'login': 30,            # Portal to answer the submitted login form
+        'download': 60,         # Downloaded file to be complete
+        'captcha_review': 0     # Time given to the user to correct the captcha before submitting
+    }
+
+    # Script which returns the text of all account cells of print preview as a list of rows
+    PRINT_PREVIEW_SCRIPT = """
+        var fields = ['ACCOUNT_NUMBER', 'ACCOUNT_NAME', 'DEPOSIT_AMOUNT', 'MONTH_PAID_UPTO', 'NEXT_RD_INSTALLMENT_DATE'];
+        var rows = [];
+        for (var i = 0; ; i++) {
+            var cells = [];
+            for (var j = 0; j < fields.length; j++) {
+                var cell = document.getElementById('HREF_CustomAgentRDAccountFG.' + fields[j] + '_ALL_ARRAY[' + i + ']');
+                if (cell === null) {
+                    return rows;
+                }
+                cells.push(cell.innerText.trim());
+            }
+            rows.push(cells);
+        }
+    """
+
+    def __init__(self, temp_download_dir=os.path.join('temp', 'downloads')):
         self.user_id = "USERID"
         self.user_password = "PASSWORD"
-        self.create_folder_if_not_exists('RDRecord')
-        self.temp_download_dir = self.create_folder_if_not_exists('temp')
+        # Keep old account snapshots and files of other sessions, every task downloads into its own folder
+        os.makedirs('RDRecord', exist_ok=True)
+        os.makedirs('temp', exist_ok=True)
+        self.temp_download_dir = os.path.abspath(temp_download_dir)
+        os.makedirs(self.temp_download_dir, exist_ok=True)
+        self.task_download_counter = itertools.count(1)
         self.driver = None
+        self.portal_url = "https://dopagent.indiapost.gov.in"
         self.ocr_apikey = "APIKEY"
         settings_data = {
             'user_id': "USERID",
@@ -95,6 +193,17 @@ class DOPWebAssistant:
             'agent_husband_name': "AGENTHUSBANDNAME",
             'ocr_apikey':"APIKEY",
             'ocr_apikey':"APIKEY",
+            'session_idle_timeout': 600,
+            'captcha_engine': "hybrid",
+            'captcha_min_confidence': 0.85,
+            'wait_timeouts': {},
+            'max_lot_accounts': 50,
+            'lot_cash_limit': 0,
+            'lot_parallel_sessions': 1,
+            'performance_profile': False,
+            'http_downloads': True,
+            'database_backend': 'sqlite',
+            'snapshot_format': 'parquet',
             "theme": "Dark",
             "ascent": "blue",
             "scale": "0"
@@ -113,23 +222,24 @@ class DOPWebAssistant:
             # Handle the case where the file is not found (e.g., first-time setup)
             pass
 
+        # Engine used to read the login captcha and confidence below which a fresh captcha is requested
+        self.captcha_min_confidence = float(settings_data.get('captcha_min_confidence', 0.85))
+        self.captcha_engine = create_captcha_engine(settings_data.get('captcha_engine', 'hybrid'), self.ocr_apikey, self.captcha_min_confidence)
+        self.max_captcha_refreshes = 5
 
-    # Function to check if a browser is installed or not
-    def is_browser_installed(self, browser_executable_name):
-        """
-        Checks if a browser is installed on the system by its executable name.
+        # Headless lean browser with a prepared profile directory per download folder
+        self.performance_profile = bool(settings_data.get('performance_profile', False))
+        self.profile_name = os.path.basename(self.temp_download_dir)
 
-        Parameters:
-        browser_executable (str): The name of the browser executable to check (e.g., 'chrome', 'msedge', 'firefox').
+        # Fetch reports directly over HTTP with the browser cookies, falling back to the browser download
+        self.http_downloads = bool(settings_data.get('http_downloads', True))
 
-        Returns:
-        bool: True if the browser is installed, False otherwise.
-        """
-        # Check if the specified browser executable exists in the browsers dictionary
-        browser = browsers.get(browser_executable_name)
+        # Format of the RDRecord snapshots, 'csv' or 'parquet'
+        self.snapshot_format = settings_data.get('snapshot_format', 'parquet')
 
-        # Return True if the browser exists, otherwise return False
-        return browser is not None
+        # Timeouts of the wait engine, settings override the defaults per step
+        self.wait_timeouts = dict(self.DEFAULT_WAIT_TIMEOUTS)
+        self.wait_timeouts.update(settings_data.get('wait_timeouts', {}))
 
 
     # Takes temporary download path and sets up the driver, then returns the driver variable
@@ -146,21 +256,138 @@ class DOPWebAssistant:
         Raises:
         NoSupportedBrowserFound: If no supported browser is found on the system.
         """
+        # Find the browser to use, from the driver cache when it is still valid
+        browser_name = self.detect_browser()
+
         # Check if Firefox is installed and set up its WebDriver
-        if self.is_browser_installed('firefox'):
+        if browser_name == 'firefox':
             return self.setup_driver_firefox(temp_download_dir)
         
         # Check if Chrome is installed and set up its WebDriver
-        elif self.is_browser_installed('chrome'):
+        elif browser_name == 'chrome':
             return self.setup_driver_chrome(temp_download_dir)
         
         # Check if Microsoft Edge is installed and set up its WebDriver
-        elif self.is_browser_installed('msedge'):
-            return self.setup_driver_edge(temp_download_dir)
-        
-        # Raise an exception if no supported browser is found
         else:
-            raise NoSupportedBrowserFound("No supported browser found")
+            return self.setup_driver_edge(temp_download_dir)
+
+
+    # Loads the cache of resolved browsers and drivers
+    def load_driver_cache(self):
+        try:
+            with open(self.DRIVER_CACHE_PATH, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'browser': None, 'browsers': {}}
+
+
+    # Saves the cache of resolved browsers and drivers using a temporary file and atomic rename
+    def save_driver_cache(self, cache):
+        temp_path = f"{self.DRIVER_CACHE_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(cache, file, indent=4)
+            os.replace(temp_path, self.DRIVER_CACHE_PATH)
+        except OSError as e:
+            logging.error(f"Error while saving driver cache: {e}")
+
+
+    # Takes a path and returns its modification time and size, or None if it does not exist
+    def get_file_signature(self, path):
+        try:
+            stat = os.stat(path)
+            return [stat.st_mtime, stat.st_size]
+        except (OSError, TypeError):
+            return None
+
+
+    # Returns name of the browser to use, scanning the system only when the cached browser changed
+    def detect_browser(self):
+        """
+        Finds the supported browser to use, preferring Firefox, then Chrome, then Edge.
+
+        The browser found last time is reused as long as its executable is unchanged, which
+        is checked with a single stat call. Otherwise the system is scanned once.
+
+        Returns:
+        str: Name of the browser, e.g. 'firefox', 'chrome' or 'msedge'.
+
+        Raises:
+        NoSupportedBrowserFound: If no supported browser is found on the system.
+        """
+        cache = self.load_driver_cache()
+        browser_name = cache.get('browser')
+        entry = cache.get('browsers', {}).get(browser_name)
+        if entry and self.get_file_signature(entry['browser_path']) == entry['browser_signature']:
+            return browser_name
+
+        logging.info("Scanning system for installed browsers...")
+        for browser_name in self.DRIVER_MANAGERS:
+            browser = browsers.get(browser_name)
+            if browser is not None:
+                self.update_browser_entry(cache, browser_name, browser)
+                cache['browser'] = browser_name
+                self.save_driver_cache(cache)
+                return browser_name
+
+        raise NoSupportedBrowserFound("No supported browser found")
+
+
+    # Takes cache, browser name and pybrowsers info and updates the cached browser details
+    def update_browser_entry(self, cache, browser_name, browser):
+        entry = cache.setdefault('browsers', {}).setdefault(browser_name, {})
+        entry['browser_path'] = browser['path']
+        entry['browser_version'] = browser.get('version')
+        entry['browser_signature'] = self.get_file_signature(browser['path'])
+        return entry
+
+
+    # Takes browser name and returns path of its driver, downloading it only on a version mismatch
+    def resolve_driver_path(self, browser_name):
+        """
+        Returns the WebDriver binary for the browser without network access when possible.
+
+        The cached driver is used while it exists, the browser executable is unchanged and the
+        driver was resolved for the major version of the browser. detect_browser may already
+        have recorded an updated browser, so the versions are compared in every case. The
+        driver is downloaded again through webdriver-manager only if the major version changed.
+
+        Parameters:
+        browser_name (str): Name of the browser, e.g. 'firefox', 'chrome' or 'msedge'.
+
+        Returns:
+        str: Path of the WebDriver binary.
+        """
+        cache = self.load_driver_cache()
+        entry = cache.get('browsers', {}).get(browser_name, {})
+        driver_path = entry.get('driver_path')
+        driver_exists = driver_path is not None and self.get_file_signature(driver_path) is not None
+
+        same_major = self.major_version(entry.get('browser_version')) == self.major_version(entry.get('driver_browser_version'))
+        if driver_exists and same_major and self.get_file_signature(entry.get('browser_path')) == entry.get('browser_signature'):
+            return driver_path
+
+        # Browser changed or was never resolved, check its version
+        old_version = entry.get('driver_browser_version')
+        browser = browsers.get(browser_name)
+        if browser is not None:
+            entry = self.update_browser_entry(cache, browser_name, browser)
+
+        if not driver_exists or self.major_version(entry.get('browser_version')) != self.major_version(old_version):
+            logging.info(f"Resolving WebDriver for {browser_name} {entry.get('browser_version')}...")
+            driver_path = self.DRIVER_MANAGERS[browser_name]().install()
+            entry['driver_path'] = driver_path
+            entry['driver_version'] = os.path.basename(os.path.dirname(driver_path))
+            entry['driver_browser_version'] = entry.get('browser_version')
+
+        cache.setdefault('browsers', {})[browser_name] = entry
+        self.save_driver_cache(cache)
+        return driver_path
+
+
+    # Takes a version string and returns its major part
+    def major_version(self, version):
+        return str(version).split('.')[0] if version else None
 
 
     def setup_driver_firefox(self, temp_download_dir):
@@ -187,9 +414,31 @@ class DOPWebAssistant:
         
         # Set the MIME types to save to disk without asking
         options_firefox.set_preference("browser.helperApps.neverAsk.saveToDisk", "application/octet-stream,application/vnd.ms-excel")
+
+        # Run headless with a lean prepared profile if performance profile is enabled
+        if self.performance_profile:
+            width, height = self.PERFORMANCE_WINDOW_SIZE
+            options_firefox.add_argument("-headless")
+            options_firefox.add_argument(f"--width={width}")
+            options_firefox.add_argument(f"--height={height}")
+            options_firefox.add_argument("-profile")
+            options_firefox.add_argument(self.get_profile_dir('firefox'))
+
+            # Images load for the captcha of the login page and are turned off after login through the chrome context
+            options_firefox.add_argument("-remote-allow-system-access")
+            options_firefox.set_preference("permissions.default.image", 1)
+            options_firefox.set_preference("gfx.downloadable_fonts.enabled", False)
+            options_firefox.set_preference("browser.display.use_document_fonts", 0)
+            options_firefox.set_preference("extensions.autoDisableScopes", 15)
+            options_firefox.set_preference("toolkit.cosmeticAnimations.enabled", False)
+            options_firefox.set_preference("ui.prefersReducedMotion", 1)
+            options_firefox.set_preference("network.prefetch-next", False)
+            options_firefox.set_preference("network.dns.disablePrefetch", True)
+            options_firefox.set_preference("network.http.speculative-parallel-limit", 0)
+            options_firefox.set_preference("browser.shell.checkDefaultBrowser", False)
         
         # Initialize the Firefox WebDriver with the specified options and service
-        driver = webdriver.Firefox(options=options_firefox, service=FirefoxService(GeckoDriverManager().install()))
+        driver = webdriver.Firefox(options=options_firefox, service=FirefoxService(self.resolve_driver_path('firefox')))
         
         return driver
 
@@ -215,10 +464,19 @@ class DOPWebAssistant:
             "download.directory_upgrade": True,                # Allow directory upgrade
             "safebrowsing.enabled": True                       # Enable safe browsing
         }
+        if self.performance_profile:
+            prefs["net.network_prediction_options"] = 2    # Disable prefetch
         options_chrome.add_experimental_option("prefs", prefs)
+
+        # Run headless with a lean prepared profile if performance profile is enabled
+        if self.performance_profile:
+            self.add_performance_arguments(options_chrome, 'chrome')
         
         # Initialize the Chrome WebDriver with the specified options and service
-        driver = webdriver.Chrome(options=options_chrome, service=ChromeService(ChromeDriverManager().install()))
+        driver = webdriver.Chrome(options=options_chrome, service=ChromeService(self.resolve_driver_path('chrome')))
+
+        if self.performance_profile:
+            self.block_static_resources(driver)
         
         return driver
 
@@ -243,38 +501,85 @@ class DOPWebAssistant:
             "download.prompt_for_download": False,             # Disable download prompt
             "download.directory_upgrade": True                 # Allow directory upgrade
         }
+        if self.performance_profile:
+            prefs["net.network_prediction_options"] = 2    # Disable prefetch
         options.add_experimental_option("prefs", prefs)
+
+        # Run headless with a lean prepared profile if performance profile is enabled
+        if self.performance_profile:
+            self.add_performance_arguments(options, 'msedge')
         
         # Initialize the Edge WebDriver with the specified options and service
-        driver = webdriver.Edge(options=options, service=EdgeService(EdgeChromiumDriverManager().install()))
+        driver = webdriver.Edge(options=options, service=EdgeService(self.resolve_driver_path('msedge')))
+
+        if self.performance_profile:
+            self.block_static_resources(driver)
         
         return driver
 
 
-    # Takes Folder name and creates a folder of that name if it does not exist and returns full path
-    def create_folder_if_not_exists(self, folder_name):
+    # Takes browser name and returns the prepared profile directory reused between launches
+    def get_profile_dir(self, browser_name):
         """
-        Creates a folder with the given name if it does not already exist, or
-        deletes and recreates it if it does exist, and returns the full path.
+        Returns the profile directory used by the performance profile, creating it if needed.
+
+        Every download folder gets its own profile so parallel sessions do not lock each other out.
 
         Parameters:
-        folder_name (str): The name of the folder to create or recreate.
+        browser_name (str): Name of the browser, e.g. 'firefox', 'chrome' or 'msedge'.
 
         Returns:
-        str: The absolute path of the created folder.
+        str: The absolute path of the profile directory.
         """
-        # Get the absolute path of the folder
-        full_path = os.path.abspath(folder_name)
-        
-        # Check if the folder already exists
-        if os.path.exists(full_path):
-            shutil.rmtree(full_path)  # Delete the folder and all its contents
-        
-        # Create the folder
-        os.makedirs(full_path)
-        
-        # Return the full path of the created folder
-        return full_path
+        profile_dir = os.path.abspath(os.path.join('BrowserProfile', f"{browser_name}_{self.profile_name}"))
+        os.makedirs(profile_dir, exist_ok=True)
+        return profile_dir
+
+
+    # Takes chromium options and adds arguments of the performance profile
+    def add_performance_arguments(self, options, browser_name):
+        """
+        Adds headless and lean arguments to Chrome or Edge options.
+
+        Parameters:
+        options (Options): Chrome or Edge options.
+        browser_name (str): Name of the browser used for the profile directory.
+        """
+        width, height = self.PERFORMANCE_WINDOW_SIZE
+        options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={width},{height}")
+        options.add_argument(f"--user-data-dir={self.get_profile_dir(browser_name)}")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-remote-fonts")
+        options.add_argument("--force-prefers-reduced-motion")
+        options.add_argument("--dns-prefetch-disable")
+        options.add_argument("--no-first-run")
+        options.add_argument("--no-default-browser-check")
+
+
+    # Blocks web fonts, and images too if asked, of pages in a chromium driver
+    def block_static_resources(self, driver, block_images=False):
+        urls = self.PERFORMANCE_BLOCKED_URLS + (self.PERFORMANCE_BLOCKED_IMAGE_URLS if block_images else [])
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+        except WebDriverException as e:
+            logging.error(f"Could not block static resources: {e}")
+
+
+    # Turns loading of images on for the captcha of the login page and off once logged in, with the performance profile
+    def set_image_loading(self, enabled):
+        if not self.performance_profile or self.driver is None:
+            return
+        try:
+            if hasattr(self.driver, 'execute_cdp_cmd'):
+                self.block_static_resources(self.driver, block_images=not enabled)
+            else:
+                with self.driver.context(self.driver.CONTEXT_CHROME):
+                    self.driver.execute_script("Services.prefs.setIntPref('permissions.default.image', arguments[0]);", 1 if enabled else 2)
+        except WebDriverException as e:
+            # Images keep loading, which is slower but never breaks the captcha
+            logging.error(f"Could not change image loading: {e}")
 
 
     # Creates a driver and opens browser and goes to dop portal
@@ -293,9 +598,12 @@ class DOPWebAssistant:
         try:
             # Set up the driver with the specified download directory
             self.driver = self.setup_driver(self.temp_download_dir)
-            self.driver.implicitly_wait(20)  # Set implicit wait time
-            self.driver.maximize_window()  # Maximize the browser window
-            self.driver.get("https://dopagent.indiapost.gov.in")  # Navigate to the specified URL
+            self.driver.implicitly_wait(0)  # Every step waits explicitly using the wait engine
+            if self.performance_profile:
+                self.driver.set_window_size(*self.PERFORMANCE_WINDOW_SIZE)  # Small fixed window
+            else:
+                self.driver.maximize_window()  # Maximize the browser window
+            self.driver.get(self.portal_url)  # Navigate to the specified URL
             logging.info("Opened the browser and navigated to the website successfully!")
 
         except WebDriverException as we:
@@ -317,67 +625,93 @@ class DOPWebAssistant:
         Logs into the DOP agent portal using provided credentials and CAPTCHA solving.
 
         This function attempts to log in by filling out the username, password,
-        and CAPTCHA fields on the DOP agent portal login page. It retries until
-        successful login or encounters an exception.
+        and CAPTCHA fields on the DOP agent portal login page. CAPTCHA reads with a
+        confidence below captcha_min_confidence are not submitted, a fresh CAPTCHA is
+        requested instead. It retries until successful login or encounters an exception.
 
         Raises:
         LoginError: If an error occurs during the login process.
         """
+        # The offline engine can not read any captcha before it learned templates
+        if not self.captcha_engine.ready:
+            logging.error("Offline CAPTCHA engine has no templates and no OCRSpace key is set.")
+            raise LoginError("Offline CAPTCHA solver has no learned templates yet. Set an OCRSpace API key or use the 'hybrid' captcha engine until it has learned some.")
+
+        # The captcha is an image, so images load on the login page even with the performance profile
+        self.set_image_loading(True)
+
         login_suc = False  # Flag to track successful login
+        refreshes = 0  # Number of low confidence captchas skipped in a row
         try:
             while not login_suc:
+                # Find the CAPTCHA image element and capture its screenshot
+                element = self.wait_for_element(By.ID, "IMAGECAPTCHA")
+                png = element.screenshot_as_png
+
+                # Solve the CAPTCHA from the in-memory image
+                text, confidence = self.captcha_engine.solve(png)
+
+                # Request a fresh CAPTCHA instead of submitting a likely wrong guess
+                if confidence < self.captcha_min_confidence and refreshes < self.max_captcha_refreshes:
+                    refreshes += 1
+                    logging.info(f"Low confidence CAPTCHA read ({confidence:.2f}), requesting a fresh CAPTCHA...")
+                    self.driver.refresh()
+                    continue
+                refreshes = 0
+
                 # Find and clear the username field, then enter user_id
-                username = self.driver.find_element(By.NAME, "AuthenticationFG.USER_PRINCIPAL")
+                username = self.wait_for_element(By.NAME, "AuthenticationFG.USER_PRINCIPAL")
                 username.clear()
                 username.send_keys(self.user_id)
                 logging.info("Username inserted successfully!")
 
                 # Find and clear the password field, then enter user_password
-                password = self.driver.find_element(By.NAME, "AuthenticationFG.ACCESS_CODE")
+                password = self.wait_for_element(By.NAME, "AuthenticationFG.ACCESS_CODE")
                 password.clear()
                 password.send_keys(self.user_password)
                 logging.info("Password inserted successfully!")
 
-                # Find the CAPTCHA image element and capture its screenshot
-                element = self.driver.find_element(By.ID, "IMAGECAPTCHA")
-                png = element.screenshot_as_png
-
-                # Process the CAPTCHA image using OCR to retrieve text
-                image = Image.open(io.BytesIO(png))
-                image = image.filter(ImageFilter.MedianFilter(size=3))
-                image = image.convert('L')
-                self.create_folder_if_not_exists('temp')
-                image.save('./temp/image.png', format='PNG')
-
-                try:
-                    text = self.ocr_space_file(filename='./temp/image.png')
-                except:
-                    text = ""
-
                 # Enter the CAPTCHA text into the input field
-                captcha_input = self.driver.find_element(By.ID, 'AuthenticationFG.VERIFICATION_CODE')
+                captcha_input = self.wait_for_element(By.ID, 'AuthenticationFG.VERIFICATION_CODE')
                 captcha_input.clear()
                 captcha_input.send_keys(text)
                 logging.info("CAPTCHA solved successfully!")
 
-                # Wait for user to complete CAPTCHA solving (adjust time if needed)
-                time.sleep(10)
+                # Give user time to correct the CAPTCHA if configured
+                if self.wait_timeouts['captcha_review'] > 0:
+                    time.sleep(self.wait_timeouts['captcha_review'])
 
                 # Click the submit button to validate credentials and CAPTCHA
-                submit_button = self.driver.find_element(By.ID, 'VALIDATE_RM_PLUS_CREDENTIALS_CATCHA_DISABLED')
-                submit_button.click()
+                submit_button = self.click_element(By.ID, 'VALIDATE_RM_PLUS_CREDENTIALS_CATCHA_DISABLED')
                 logging.info("Submitted login details successfully!")
 
+                # Wait until the portal answers with either the Accounts menu or a new login form
                 try:
-                    # Check if login was successful by finding the Accounts button
-                    self.driver.find_element(By.ID, 'Accounts')
-                    login_suc = True  # Set login_suc to True if Accounts button Not found
-                    os.remove('./temp/image.png')
-                    logging.info("Login successful!")
-                except NoSuchElementException:
+                    self.wait_for(EC.any_of(
+                        EC.staleness_of(submit_button),
+                        EC.presence_of_element_located((By.ID, 'Accounts'))
+                    ), 'login')
+                except TimeoutException:
+                    # Portal showed the error without reloading the login page
+                    pass
+                self.wait_for(EC.any_of(
+                    EC.presence_of_element_located((By.ID, 'Accounts')),
+                    EC.presence_of_element_located((By.ID, 'IMAGECAPTCHA'))
+                ), 'login')
+
+                # Check if login was successful by finding the Accounts button
+                if self.find_optional(By.ID, 'Accounts') is None:
                     logging.info("Login unsuccessful. Trying to login again...")
                     continue  # Retry login process if Accounts button not found
 
+                login_suc = True  # Set login_suc to True if Accounts button found
+                logging.info("Login successful!")
+                self.set_image_loading(False)
+
+                # The portal accepted the text, so it is a correctly labelled captcha
+                if hasattr(self.captcha_engine, 'learn'):
+                    self.captcha_engine.learn(png, text)
+
         except Exception as login_error:
             # Log any errors during login and raise a custom LoginError
             logging.error(f"Error during login: {login_error}")
@@ -385,44 +719,6 @@ class DOPWebAssistant:
             raise LoginError("Error while logging in to account.")
 
 
-    # Takes the image file and returns the solved captcha text using OCRSpace API
-    def ocr_space_file(self, filename, overlay=False, language='eng'):
-        """
-        Performs OCR (Optical Character Recognition) on the given image file using the OCRSpace API.
-
-        Args:
-        filename (str): The path to the image file to be processed.
-        overlay (bool, optional): Whether to overlay the result on the image. Defaults to False.
-        language (str, optional): The language code for OCR processing. Defaults to 'eng' (English).
-
-        Returns:
-        str: The extracted text from the image after OCR processing.
-
-        Raises:
-        Exception: If there is an error during the API request or parsing the response.
-        """
-        payload = {
-            'isOverlayRequired': overlay,
-            'apikey': self.ocr_apikey,
-            'language': language,
-        }
-
-        try:
-            with open(filename, 'rb') as f:
-                r = requests.post('https://api.ocr.space/parse/image',
-                                files={filename: f},
-                                data=payload)
-
-            response = r.content.decode()
-            data = json.loads(response)
-            parsed_text = data["ParsedResults"][0]["ParsedText"].strip()
-            return parsed_text
-
-        except Exception as e:
-            # Log any errors encountered during OCR processing and raise an exception
-            logging.error(f"Error during OCR processing: {e}")
-            raise Exception("Error during OCR processing.")
-
     # Close the Browser
     def close_browser(self):
         """
@@ -440,16 +736,152 @@ class DOPWebAssistant:
             except WebDriverException as e:
                 logging.error(f"WebDriverException while closing browser: {e}")
                 raise WebDriverException("Error occurred while closing the browser.")
+            finally:
+                self.driver = None
+
+
+    # Waits until the given condition is true and returns its value
+    def wait_for(self, condition, step='element'):
+        """
+        Waits on an explicit condition using the timeout configured for the step.
+
+        Args:
+        condition (callable): Expected condition or function which takes the driver.
+        step (str, optional): Name of the step in wait_timeouts. Defaults to 'element'.
+
+        Returns:
+        object: The truthy value returned by the condition.
+
+        Raises:
+        TimeoutException: If the condition is not met within the step timeout.
+        """
+        return WebDriverWait(self.driver, self.wait_timeouts[step], poll_frequency=0.2).until(condition)
+
+
+    # Waits for an element to be present and returns it
+    def wait_for_element(self, by, value, step='element'):
+        """
+        Waits for an element to be present in the page.
+
+        Args:
+        by (str): Locator strategy from selenium By.
+        value (str): Locator value.
+        step (str, optional): Name of the step in wait_timeouts. Defaults to 'element'.
+
+        Returns:
+        WebElement: The located element.
+
+        Raises:
+        NoSuchElementException: If the element does not appear within the step timeout.
+        """
+        try:
+            return self.wait_for(EC.presence_of_element_located((by, value)), step)
+        except TimeoutException:
+            raise NoSuchElementException(f"Element not found: {value}")
+
+
+    # Waits for an element to be clickable and for blockUI overlay to disappear, then clicks it
+    def click_element(self, by, value, step='element'):
+        """
+        Waits until the element is clickable and no blockUI overlay covers the page, then clicks it.
+
+        Args:
+        by (str): Locator strategy from selenium By.
+        value (str): Locator value.
+        step (str, optional): Name of the step in wait_timeouts. Defaults to 'element'.
+
+        Returns:
+        WebElement: The clicked element.
+
+        Raises:
+        NoSuchElementException: If the element is not clickable within the step timeout.
+        """
+        try:
+            element = self.wait_for(EC.element_to_be_clickable((by, value)), step)
+        except TimeoutException:
+            raise NoSuchElementException(f"Element not found: {value}")
+        self.wait_for_overlay_gone()
+        element.click()
+        return element
+
+
+    # Returns the element if it is present right now or None, without waiting
+    def find_optional(self, by, value):
+        """
+        Looks up an element which may legitimately be missing without paying any wait.
+
+        Args:
+        by (str): Locator strategy from selenium By.
+        value (str): Locator value.
+
+        Returns:
+        WebElement: The element, or None if it is not present.
+        """
+        elements = self.driver.find_elements(by, value)
+        return elements[0] if elements else None
+
+
+    # Waits for the blockUI overlay of portal to disappear
+    def wait_for_overlay_gone(self):
+        self.wait_for(EC.invisibility_of_element_located((By.CSS_SELECTOR, ".blockUI.blockOverlay")), 'overlay')
+
+
+    # Waits for a new window to open and switches to it
+    def wait_for_new_window(self, handles_before):
+        """
+        Waits for a new browser window or tab to open and switches the driver to it.
+
+        Args:
+        handles_before (list): Window handles which existed before the window was opened.
+
+        Returns:
+        str: Handle of the new window.
+        """
+        self.wait_for(EC.new_window_is_opened(handles_before), 'new_window')
+        new_handle = [handle for handle in self.driver.window_handles if handle not in handles_before][-1]
+        self.driver.switch_to.window(new_handle)
+        return new_handle
+
+
+    # Context manager which gives a download watcher on an isolated download folder for one task
+    @contextmanager
+    def task_download(self):
+        """
+        Prepares an isolated download folder for one task and watches it for the finished file.
+
+        Chrome and Edge are switched to a fresh folder of the task, so downloads of several
+        tasks never mix. Firefox cannot change its download folder after start, its session
+        folder is watched and only files which appear after the task started are considered.
+        The task folder is removed when the task is done, so move the file out before leaving.
+
+        Yields:
+        DownloadWatcher: Watcher whose wait method returns the path of the finished file.
+        """
+        task_dir = None
+        download_dir = self.temp_download_dir
+        if hasattr(self.driver, 'execute_cdp_cmd'):
+            task_dir = os.path.join(self.temp_download_dir, f"task_{os.getpid()}_{next(self.task_download_counter)}")
+            os.makedirs(task_dir, exist_ok=True)
+            self.driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": task_dir})
+            download_dir = task_dir
+
+        try:
+            with DownloadWatcher(download_dir) as watcher:
+                yield watcher
+        finally:
+            if task_dir is not None:
+                shutil.rmtree(task_dir, ignore_errors=True)
 
 
     # Takes two arrays account numbers and no of installments and performs lot
-    def perform_lot_task(self, acc_nos, no_installments):
+    def perform_lot_task(self, acc_nos, no_installments, on_step=None):
         """
         Performs the LOT task on the DOP agent portal.
 
         Args:
         acc_nos (list): List of account numbers to perform LOT.
         no_installments (list): List of number of installments corresponding to each account.
+        on_step (callable, optional): Called with step name and details after each completed step.
 
         Returns:
         str: Reference number extracted after completing the LOT task.
@@ -457,10 +889,12 @@ class DOPWebAssistant:
         Raises:
         LotTaskError: If there is an error during any step of the LOT task.
         """
+        if on_step is None:
+            on_step = lambda step, **data: None
+
         try:
             # Navigate to Accounts page
-            accounts_button = self.driver.find_element(By.ID, 'Accounts')
-            accounts_button.click()
+            self.click_element(By.ID, 'Accounts')
             logging.info("Navigated to Accounts page successfully!")
 
             # Calculate page navigation variables
@@ -472,20 +906,18 @@ class DOPWebAssistant:
                 elem_last_page = 10
 
             # Navigate to Agent Enquire & Update Screen
-            agent_enquire_button = self.driver.find_element(By.ID, 'Agent Enquire & Update Screen')
-            agent_enquire_button.click()
+            self.click_element(By.ID, 'Agent Enquire & Update Screen')
             logging.info("Navigated to Agent Enquire & Update Screen page successfully!")
 
             # Enter account numbers and fetch accounts
-            text_box = self.driver.find_element(By.ID, 'CustomAgentRDAccountFG.ACCOUNT_NUMBER_FOR_SEARCH')
+            text_box = self.wait_for_element(By.ID, 'CustomAgentRDAccountFG.ACCOUNT_NUMBER_FOR_SEARCH')
             text_box.send_keys(','.join(map(str, acc_nos)))
-            fetch_button = self.driver.find_element(By.ID, 'Button3087042')
-            fetch_button.click()
+            self.click_element(By.ID, 'Button3087042')
             logging.info("Accounts fetched successfully!")
+            on_step('accounts_fetched', accounts=n)
 
             # Select Cash mode of Payment
-            cash_button = self.driver.find_element(By.XPATH, '//input[@id="CustomAgentRDAccountFG.PAY_MODE_SELECTED_FOR_TRN"][@value="C"]')
-            cash_button.click()
+            self.click_element(By.XPATH, '//input[@id="CustomAgentRDAccountFG.PAY_MODE_SELECTED_FOR_TRN"][@value="C"]')
             logging.info("Cash mode of Payment selected successfully!")
 
             # Select all accounts and save the LOT
@@ -493,66 +925,54 @@ class DOPWebAssistant:
                 page_limit = elem_last_page if i == no_pages - 1 else 10
                 
                 for j in range(page_limit):
-                    try:
-                        checkbox = self.driver.find_element(By.ID, f'CustomAgentRDAccountFG.SELECT_INDEX_ARRAY[{i * 10 + j}]')
+                    # Missing checkboxes are skipped without waiting
+                    checkbox = self.find_optional(By.ID, f'CustomAgentRDAccountFG.SELECT_INDEX_ARRAY[{i * 10 + j}]')
+                    if checkbox is not None:
                         checkbox.click()
-                    except NoSuchElementException:
-                        pass
                 
                 button_id = 'Button26553257' if i == no_pages - 1 else 'Action.AgentRDActSummaryAllListing.GOTO_NEXT__'
-                self.driver.find_element(By.ID, button_id).click()
+                page_button = self.click_element(By.ID, button_id)
+
+                # Wait for the next page to be loaded before selecting its rows
+                if i < no_pages - 1:
+                    self.wait_for(EC.any_of(
+                        EC.staleness_of(page_button),
+                        EC.presence_of_element_located((By.ID, f'CustomAgentRDAccountFG.SELECT_INDEX_ARRAY[{(i + 1) * 10}]'))
+                    ))
+                    self.wait_for_overlay_gone()
+                on_step('page_selected', page=i + 1, pages=no_pages)
             
             logging.info("Selected all accounts and saved the LOT successfully!")
             
 
             # Change number of installments for accounts with more than one installment
-            for i in range(n):
-                if int(no_installments[i]) > 1:
-                    element_found_on_current_page = False
-
-                    for j in range(no_pages):
-                        page_limit = elem_last_page if j == no_pages - 1 else 10
-
-                        for k in range(page_limit):
-                            index = (j * 10) + k
-                            element_id = f'HREF_CustomAgentRDAccountFG.ACCOUNT_NUMBER_ARRAY[{index}]'
-
-                            if self.driver.find_element(By.ID, element_id).text == str(acc_nos[i]):
-                                radio_button = self.driver.find_element(By.XPATH,f'//input[@id="CustomAgentRDAccountFG.SELECTED_INDEX"][@value="{index}"]')
-                                radio_button.click()
-
-                                no_installments_box = self.driver.find_element(By.ID, 'CustomAgentRDAccountFG.RD_INSTALLMENT_NO')
-                                no_installments_box.clear()
-                                no_installments_box.send_keys(no_installments[i])
-
-                                save_installments_button = self.driver.find_element(By.ID, 'Button11874602')
-                                save_installments_button.click()
-
-                                element_found_on_current_page = True
-                                break
-
-                        if not element_found_on_current_page:
-                            next_page_button = self.driver.find_element(By.ID, 'Action.SelectedAgentRDActSummaryListing.GOTO_NEXT__')
-                            next_page_button.click()
-
-                        if element_found_on_current_page:
-                            break
+            installments_by_acc = {str(acc_nos[i]): no_installments[i] for i in range(n) if int(no_installments[i]) > 1}
+            if installments_by_acc:
+                self.save_installments_in_page_order(installments_by_acc, no_pages)
 
             logging.info("Changed number of installments successfully!")
+            on_step('installments_saved', accounts=len(installments_by_acc))
 
-            # Pay all saved installments
-            pay_saved_installments_button = self.driver.find_element(By.ID, 'PAY_ALL_SAVED_INSTALLMENTS')
-            pay_saved_installments_button.click()
+            # Pay all saved installments, the step is recorded first as the payment can not be undone
+            pay_button = self.wait_for(EC.element_to_be_clickable((By.ID, 'PAY_ALL_SAVED_INSTALLMENTS')))
+            self.wait_for_overlay_gone()
+            on_step('pay_submitted')
+            pay_button.click()
             logging.info("Paid all saved installments successfully!")
 
             # Extract reference number from alert
-            ref_no_alert = self.driver.find_element(By.XPATH, '//div[@class="greenbg"][@role="alert"]')
+            ref_no_alert = self.wait_for_element(By.XPATH, '//div[@class="greenbg"][@role="alert"]')
             reference_no = ref_no_alert.text.split()[7].split('.')[0]
             logging.info("Extracted reference number successfully!")
+            on_step('paid', ref_no=reference_no)
 
             # Return reference number
             return reference_no
 
+        except LotTaskError as e:
+            # Raised with the specific reason, which is kept for the operator
+            logging.error(f"LOT task failed: {e}")
+            raise
         except NoSuchElementException as e:
             logging.error(f"Element not found: {e}")
             raise LotTaskError("Error while saving the LOT")
@@ -561,94 +981,272 @@ class DOPWebAssistant:
             raise LotTaskError("Error while saving the LOT")
 
 
-    # Takes referance number download path and downloads the Report xls file
-    def perform_download_report_task(self, ref_no, download_path):
+    # Performs the LOT and downloads its report, resuming from the steps recorded in the journal
+    def perform_journaled_lot_task(self, acc_nos, no_installments, download_path, journal, on_paid=None):
         """
-        Performs the task to download the Report xls file using the reference number on the DOP agent portal.
+        Performs the LOT task and downloads its report, recording every step in a journal.
+
+        A LOT which was paid before an interruption is not performed again, only its report is
+        downloaded. A LOT interrupted before payment is performed from the start, since the
+        selection of accounts is lost with the browser session.
 
         Args:
-        ref_no (str): Reference number used to search and download the report.
+        acc_nos (list): List of account numbers to perform LOT.
+        no_installments (list): List of number of installments corresponding to each account.
         download_path (str): Path where the downloaded report should be saved.
+        journal (TaskJournal): Journal of this LOT.
+        on_paid (callable, optional): Called once per LOT with the reference number as soon as it
+        is paid, before its report is downloaded. A resumed LOT calls it only if the earlier run
+        was interrupted before the call completed. Defaults to None.
 
         Returns:
-        str: Full path of the downloaded report file.
+        tuple: Reference number and full path of the downloaded report file.
 
         Raises:
-        DownloadTaskError: If there is an error during any step of the download task.
+        LotTaskError: If the payment was submitted but its result was not recorded.
         """
-        try:
-            # Navigate to Accounts page
-            accounts_button = self.driver.find_element(By.ID, 'Accounts')
-            accounts_button.click()
-            logging.info("Navigated to Accounts page successfully!")
+        paid = journal.last('paid')
+        if paid is not None:
+            ref_no = paid['ref_no']
+            logging.info(f"Resuming LOT already paid with reference number {ref_no}")
+        elif journal.last('pay_submitted') is not None:
+            raise LotTaskError(f"Payment of this LOT was submitted before an interruption, check the portal before performing it again ({journal.path})")
+        else:
+            ref_no = self.perform_lot_task(acc_nos, no_installments, on_step=journal.append)
 
-            # Navigate to Reports Section
-            reports_button = self.driver.find_element(By.ID, 'Reports')
-            reports_button.click()
-            logging.info("Navigated to Reports Section successfully!")
-
-            # Insert Reference Number
-            ref_no_input = self.driver.find_element(By.ID, 'CustomAgentRDAccountFG.EBANKING_REF_NUMBER')
-            ref_no_input.send_keys(ref_no)
-            logging.info("Inserted Reference Number successfully!")
-
-            # Select 'Success' from dropdown
-            select_success = self.driver.find_element(By.ID, "CustomAgentRDAccountFG.INSTALLMENT_STATUS")
-            select = Select(select_success)
-            select.select_by_value('SUC')
-
-            # Clear and set From Date to the first day of the current month
-            from_date_field = self.driver.find_element(By.ID, "CustomAgentRDAccountFG.REPORT_DATE_FROM")
-            from_date_field.clear()
-            current_date = datetime.now()
-            first_date_of_month = current_date.replace(day=1)
-            formatted_date = first_date_of_month.strftime("%d-%b-%Y")
-            from_date_field.send_keys(formatted_date)
-            logging.info("Selected From Date successfully!")
-
-            # Click Search button
-            search_button = self.driver.find_element(By.ID, 'SearchBtn')
-            search_button.click()
-            logging.info("Clicked Search button successfully!")
-
-            # Select output format (4 refers to the xls file)
-            select_outformat = self.driver.find_element(By.ID, "CustomAgentRDAccountFG.OUTFORMAT")
-            select = Select(select_outformat)
-            select.select_by_value('4')
+        if on_paid is not None and journal.last('paid_applied') is None:
+            on_paid(ref_no)
+            journal.append('paid_applied', ref_no=ref_no)
+
+        downloaded = journal.last('report_downloaded')
+        if downloaded is not None and os.path.exists(downloaded['path']):
+            report_path = downloaded['path']
+        else:
+            report_path = self.perform_download_report_task(ref_no, download_path)
+            journal.append('report_downloaded', ref_no=ref_no, path=report_path)
+        return ref_no, report_path
+
+
+    # Reads row index and account number of all rows on current page of selected accounts with one script call
+    def read_selected_accounts_page(self):
+        """
+        Reads the current page of the selected accounts table in one WebDriver round trip.
+
+        Returns:
+        list: Pairs of [row index, account number] of the rows on the current page.
+        """
+        return self.driver.execute_script(self.SELECTED_ACCOUNTS_SCRIPT)
+
+
+    # Takes dict of account number and installments and saves installments walking the pager only once
+    def save_installments_in_page_order(self, installments_by_acc, no_pages):
+        """
+        Saves the number of installments of multi-installment accounts in one pass through the pager.
+
+        Each page of the selected accounts table is read once, the pending accounts of that page
+        are edited in row order and the pager moves forward only while some accounts are still
+        pending.
+
+        Args:
+        installments_by_acc (dict): Account number to number of installments.
+        no_pages (int): Number of pages of the selected accounts table.
+
+        Raises:
+        LotTaskError: If some accounts are not found in the selected accounts table.
+        """
+        pending = dict(installments_by_acc)
+
+        for page in range(no_pages):
+            rows = self.read_selected_accounts_page()
 
-            # Click Download button
-            download_button = self.driver.find_element(By.ID, 'GENERATE_REPORT')
-            download_button.click()
+            # Edit the pending accounts of this page in row order
+            for index, acc_no in sorted(rows):
+                if acc_no not in pending:
+                    continue
+                self.click_element(By.XPATH, f'//input[@id="CustomAgentRDAccountFG.SELECTED_INDEX"][@value="{int(index)}"]')
 
-            # Wait for block overlay to disappear
-            wait = WebDriverWait(self.driver, 10)
-            wait.until(EC.invisibility_of_element_located((By.CLASS_NAME, "blockUI.blockOverlay")))
-            logging.info("Download completed successfully!")
+                no_installments_box = self.wait_for_element(By.ID, 'CustomAgentRDAccountFG.RD_INSTALLMENT_NO')
+                no_installments_box.clear()
+                no_installments_box.send_keys(str(pending.pop(acc_no)))
 
-            # Get default download directory
-            default_download_dir = self.temp_download_dir
+                self.click_element(By.ID, 'Button11874602')
+                logging.info(f"Saved installments for account number: {acc_no}")
 
-            # Get downloaded file name
-            downloaded_file_name = os.listdir(default_download_dir)[0]
+            if not pending or page == no_pages - 1:
+                break
 
-            # Get downloaded file path
-            downloaded_file_path = os.path.join(default_download_dir, downloaded_file_name)
+            # Move to the next page and wait for its rows
+            next_page_button = self.click_element(By.ID, 'Action.SelectedAgentRDActSummaryListing.GOTO_NEXT__')
+            self.wait_for(EC.any_of(
+                EC.staleness_of(next_page_button),
+                EC.presence_of_element_located((By.ID, f'HREF_CustomAgentRDAccountFG.ACCOUNT_NUMBER_ARRAY[{(page + 1) * 10}]'))
+            ))
+            self.wait_for_overlay_gone()
 
-            # Format new file name
-            new_file_name = f"RDReport-{current_date.strftime('%d-%m-%Y-%H-%M-%S')}-{ref_no}.xls"
+        if pending:
+            raise LotTaskError(f"Accounts not found in selected accounts: {', '.join(pending)}")
+
+
+    # Takes lot accounts, splits them into shards and performs every shard in its own browser process
+    def perform_sharded_lot_task(self, acc_nos, no_installments, download_path, max_lot_accounts=50, max_sessions=2, completed=None):
+        """
+        Performs a large LOT as several smaller LOTs running in parallel browser sessions.
+
+        The accounts are split into shards of at most max_lot_accounts accounts. Every shard
+        runs perform_lot_task and downloads its report in its own WebDriver process, with at
+        most max_sessions browsers open at the same time. Shards completed by an earlier run are
+        not performed again. Shard journals are kept, so a shard paid before a failure is
+        resumed without paying it again, the caller clears them once every shard succeeded.
+
+        Args:
+        acc_nos (list): List of account numbers to perform LOT.
+        no_installments (list): List of number of installments corresponding to each account.
+        download_path (str): Path where the downloaded reports should be saved.
+        max_lot_accounts (int, optional): Maximum number of accounts in one shard. Defaults to 50.
+        max_sessions (int, optional): Maximum number of parallel browser sessions. Defaults to 2.
+        completed (dict, optional): shard_key of completed shards to dict with ref_no and report_path. Defaults to None.
+
+        Returns:
+        list: One dict per shard, in shard order, with keys index, acc_nos, no_installments,
+        ref_no, report_path, skipped and error. skipped is True for shards completed earlier
+        and error is None for shards which completed.
+        """
+        completed = completed or {}
+        shards = split_lot_into_shards(acc_nos, no_installments, max_lot_accounts)
+        skipped = {index: {
+            'index': index,
+            'acc_nos': shard_acc_nos,
+            'no_installments': shard_installments,
+            'ref_no': completed[shard_key(shard_acc_nos)]['ref_no'],
+            'report_path': completed[shard_key(shard_acc_nos)]['report_path'],
+            'skipped': True,
+            'error': None
+        } for index, (shard_acc_nos, shard_installments) in enumerate(shards) if shard_key(shard_acc_nos) in completed}
+        shard_args = [{
+            'index': index,
+            'acc_nos': shard_acc_nos,
+            'no_installments': shard_installments,
+            'download_path': download_path,
+            'user_id': self.user_id,
+            'user_password': self.user_password,
+            'portal_url': self.portal_url
+        } for index, (shard_acc_nos, shard_installments) in enumerate(shards) if index not in skipped]
+
+        logging.info(f"Performing LOT of {len(acc_nos)} accounts as {len(shards)} shards in {max_sessions} sessions, {len(skipped)} already completed.")
+        performed = []
+        if shard_args:
+            with ProcessPoolExecutor(max_workers=max(1, min(max_sessions, len(shard_args)))) as executor:
+                performed = list(executor.map(run_lot_shard, shard_args))
+        results = sorted(list(skipped.values()) + performed, key=lambda result: result['index'])
+
+        for result in results:
+            if result['error']:
+                logging.error(f"LOT shard {result['index']} failed: {result['error']}")
+            else:
+                logging.info(f"LOT shard {result['index']} completed with reference number {result['ref_no']}")
+        return results
+
+
+    # Takes referance number and fills the installment report form in the browser up to the download button
+    def open_report_form(self, ref_no):
+        """
+        Navigates to the Reports section and searches the installment report of a reference number.
+
+        Args:
+        ref_no (str): Reference number used to search the report.
+        """
+        # Navigate to Accounts page
+        self.click_element(By.ID, 'Accounts')
+        logging.info("Navigated to Accounts page successfully!")
+
+        # Navigate to Reports Section
+        self.click_element(By.ID, 'Reports')
+        logging.info("Navigated to Reports Section successfully!")
+
+        # Insert Reference Number
+        ref_no_input = self.wait_for_element(By.ID, 'CustomAgentRDAccountFG.EBANKING_REF_NUMBER')
+        ref_no_input.send_keys(ref_no)
+        logging.info("Inserted Reference Number successfully!")
+
+        # Select 'Success' from dropdown
+        select_success = self.wait_for_element(By.ID, "CustomAgentRDAccountFG.INSTALLMENT_STATUS")
+        select = Select(select_success)
+        select.select_by_value('SUC')
+
+        # Clear and set From Date to the first day of the current month
+        from_date_field = self.wait_for_element(By.ID, "CustomAgentRDAccountFG.REPORT_DATE_FROM")
+        from_date_field.clear()
+        first_date_of_month = datetime.now().replace(day=1)
+        formatted_date = first_date_of_month.strftime("%d-%b-%Y")
+        from_date_field.send_keys(formatted_date)
+        logging.info("Selected From Date successfully!")
+
+        # Click Search button
+        self.click_element(By.ID, 'SearchBtn')
+        logging.info("Clicked Search button successfully!")
+
+        # Select output format (4 refers to the xls file)
+        select_outformat = self.wait_for_element(By.ID, "CustomAgentRDAccountFG.OUTFORMAT")
+        select = Select(select_outformat)
+        select.select_by_value('4')
+
+
+    # Takes referance number and download path and returns path of the report file
+    def get_report_file_path(self, ref_no, download_path):
+        new_file_name = f"RDReport-{datetime.now().strftime('%d-%m-%Y-%H-%M-%S')}-{ref_no}.xls"
+        return os.path.join(download_path, new_file_name)
+
+
+    # Takes referance number download path and downloads the Report xls file
+    def perform_download_report_task(self, ref_no, download_path, session=None):
+        """
+        Performs the task to download the Report xls file using the reference number on the DOP agent portal.
+
+        The report is fetched directly over HTTP with the cookies of the browser session when
+        http_downloads is enabled, and through the browser download otherwise or if that fails.
+
+        Args:
+        ref_no (str): Reference number used to search and download the report.
+        download_path (str): Path where the downloaded report should be saved.
+        session (Session, optional): Session of create_http_session to reuse. Defaults to a new one.
+
+        Returns:
+        str: Full path of the downloaded report file.
+
+        Raises:
+        DownloadTaskError: If there is an error during any step of the download task.
+        """
+        try:
+            self.open_report_form(ref_no)
 
             # Get new file path
-            new_file_path = os.path.join(download_path, new_file_name)
+            new_file_path = self.get_report_file_path(ref_no, download_path)
+
+            if self.http_downloads:
+                try:
+                    session = session or self.create_http_session()
+                    form = self.capture_form('GENERATE_REPORT')
+                    self.fetch_form_to_file(session, form, {}, new_file_path)
+                    logging.info(f"Downloaded report over HTTP to {new_file_path}")
+                    return new_file_path
+                except Exception as e:
+                    logging.info(f"HTTP download failed, downloading with the browser: {e}")
+
+            # Click Download button and wait for the downloaded file to be complete
+            with self.task_download() as watcher:
+                self.click_element(By.ID, 'GENERATE_REPORT')
+                downloaded_file_path = watcher.wait(self.wait_timeouts['download'])
+                logging.info("Download completed successfully!")
 
-            # Check if new file already exists
-            if os.path.exists(new_file_path):
-                # Delete old file
-                os.remove(new_file_path)
-                logging.info(f"Deleted old file at {new_file_path}")
+                # Check if new file already exists
+                if os.path.exists(new_file_path):
+                    # Delete old file
+                    os.remove(new_file_path)
+                    logging.info(f"Deleted old file at {new_file_path}")
 
-            # Move and rename downloaded file to new directory
-            shutil.move(downloaded_file_path, new_file_path)
-            logging.info(f"Moved and renamed file to {new_file_path}")
+                # Move and rename downloaded file to new directory
+                shutil.move(downloaded_file_path, new_file_path)
+                logging.info(f"Moved and renamed file to {new_file_path}")
 
             return new_file_path
 
@@ -660,55 +1258,186 @@ class DOPWebAssistant:
             raise DownloadTaskError("Error while downloading report")
 
 
+    # Takes list of referance numbers and download path and downloads all reports over one HTTP session
+    def perform_download_reports_task(self, ref_nos, download_path):
+        """
+        Downloads the Report xls files of several reference numbers.
+
+        The portal generates a report from the search held in its session, so the search is
+        filled in the browser for every reference number and the reports are fetched one after
+        another, reusing one HTTP session and its connection.
+
+        Args:
+        ref_nos (list): Reference numbers of the reports.
+        download_path (str): Path where the downloaded reports should be saved.
+
+        Returns:
+        dict: Reference number to full path of its downloaded report file.
+
+        Raises:
+        DownloadTaskError: If a report could not be downloaded.
+        """
+        session = None
+        if self.http_downloads and ref_nos:
+            try:
+                session = self.create_http_session()
+            except Exception as e:
+                logging.info(f"HTTP session not available, downloading with the browser: {e}")
+
+        paths = {}
+        for ref_no in ref_nos:
+            paths[ref_no] = self.perform_download_report_task(ref_no, download_path, session)
+        return paths
+
+
+    # Returns a requests session which carries the cookies of the logged in browser
+    def create_http_session(self):
+        """
+        Hands the WebDriver session cookies to a requests session.
+
+        Returns:
+        Session: A requests session authenticated like the browser.
+        """
+        session = requests.Session()
+        session.headers['User-Agent'] = self.driver.execute_script("return navigator.userAgent;")
+        session.headers['Referer'] = self.driver.current_url
+        for cookie in self.driver.get_cookies():
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        return session
+
+
+    # Takes id of a submit button and returns the form it submits as it is filled in the browser
+    def capture_form(self, button_id):
+        """
+        Reads the form submitted by a button, with its current values, in one script call.
+
+        Args:
+        button_id (str): Id of the submit button.
+
+        Returns:
+        dict: The form action, method and list of [name, value] fields including the button.
+        """
+        self.wait_for_element(By.ID, button_id)
+        return self.driver.execute_script(self.FORM_SCRIPT, button_id)
+
+
+    # Posts a captured form with some fields overridden and streams the response file to disk
+    def fetch_form_to_file(self, session, form, overrides, file_path):
+        """
+        Submits a captured form over HTTP and streams the returned file to disk.
+
+        Args:
+        session (Session): Session returned by create_http_session.
+        form (dict): Form returned by capture_form.
+        overrides (dict): Field name to value replacing the captured value.
+        file_path (str): Path where the file is saved.
+
+        Raises:
+        DownloadTaskError: If the portal answers with a page instead of a file.
+        """
+        fields = [(name, overrides.get(name, value)) for name, value in form['fields']]
+        with session.request(form['method'], form['action'], data=fields, stream=True,
+                             timeout=self.wait_timeouts['download']) as response:
+            response.raise_for_status()
+            disposition = response.headers.get('Content-Disposition', '')
+            if 'attachment' not in disposition and 'html' in response.headers.get('Content-Type', ''):
+                raise DownloadTaskError("Portal returned a page instead of a report file")
+
+            # Write to a temporary file first so a broken transfer never leaves a partial report
+            temp_path = file_path + '.part'
+            try:
+                with open(temp_path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        file.write(chunk)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        os.replace(temp_path, file_path)
+
+
     # Takes two lists account numbers and aslaas numbers and update those
-    def perform_update_aslaas_task(self, acc_nos, aslaas_nos):
+    def perform_update_aslaas_task(self, acc_nos, aslaas_nos, on_confirmed=None, retries=1):
         """
         Performs the task to update ASLAAS numbers for given account numbers on the DOP agent portal.
 
+        A failure of one account does not abort the batch. The account is retried after the others,
+        and every account which is saved on the portal is reported through on_confirmed right away.
+
         Args:
         acc_nos (list): List of account numbers for which ASLAAS numbers need to be updated.
         aslaas_nos (list): List of ASLAAS numbers corresponding to each account number.
+        on_confirmed (callable, optional): Called with account number and ASLAAS number after each save.
+        retries (int, optional): Number of extra passes over the failed accounts. Defaults to 1.
+
+        Returns:
+        list: Account numbers which could not be updated.
 
         Raises:
-        UpdateAslaasError: If there is an error during any step of the update ASLAAS task.
+        UpdateAslaasError: If the Update ASLAAS Number page could not be opened.
         """
-        try:
-            # Navigate to Accounts page
-            accounts_button = self.driver.find_element(By.ID, 'Accounts')
-            accounts_button.click()
-            logging.info("Navigated to Accounts page successfully!")
+        pending = list(zip(acc_nos, aslaas_nos))
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            try:
+                self.open_update_aslaas_page()
+            except Exception as e:
+                logging.error(f"Error during update ASLAAS task: {e}")
+                raise UpdateAslaasError("Error while updating ASLAAS number")
 
-            # Navigate to Update ASLAAS Number Section
-            update_aslaas_button = self.driver.find_element(By.ID, 'Update ASLAAS Number')
-            update_aslaas_button.click()
-            logging.info("Navigated to Update ASLAAS page successfully!")
+            failed = []
+            for acc_no, aslaas_no in pending:
+                try:
+                    self.update_aslaas_number(acc_no, aslaas_no)
+                except Exception as e:
+                    logging.error(f"Error while updating ASLAAS number for account number {acc_no}: {e}")
+                    failed.append((acc_no, aslaas_no))
+                    # Reload the page so the next account starts from a clean form
+                    try:
+                        self.open_update_aslaas_page()
+                    except Exception as e:
+                        logging.error(f"Error during update ASLAAS task: {e}")
+                        raise UpdateAslaasError("Error while updating ASLAAS number")
+                    continue
 
-            # Loop through account numbers and update ASLAAS number for each account
-            for i in range(len(acc_nos)):
-                # Enter account number
-                acc_no_input = self.driver.find_element(By.ID, 'CustomAgentAslaasNoFG.RD_ACC_NO')
-                acc_no_input.send_keys(acc_nos[i])
+                logging.info(f"Updated ASLAAS number for account number: {acc_no}")
+                if on_confirmed is not None:
+                    on_confirmed(acc_no, aslaas_no)
+            pending = failed
 
-                # Enter ASLAAS number
-                aslaas_no_input = self.driver.find_element(By.ID, 'CustomAgentAslaasNoFG.ASLAAS_NO')
-                aslaas_no_input.send_keys(aslaas_nos[i])
+        return [acc_no for acc_no, _ in pending]
 
-                # Click Continue button
-                continue_button = self.driver.find_element(By.ID, 'LOAD_CONFIRM_PAGE')
-                continue_button.click()
 
-                # Click Save button
-                save_button = self.driver.find_element(By.ID, 'ADD_FIELD_SUBMIT')
-                save_button.click()
+    # Navigates to the Update ASLAAS Number page
+    def open_update_aslaas_page(self):
+        # Navigate to Accounts page
+        self.click_element(By.ID, 'Accounts')
+        logging.info("Navigated to Accounts page successfully!")
 
-                logging.info(f"Updated ASLAAS number for account number: {acc_nos[i]}")
+        # Navigate to Update ASLAAS Number Section
+        self.click_element(By.ID, 'Update ASLAAS Number')
+        logging.info("Navigated to Update ASLAAS page successfully!")
 
-        except NoSuchElementException as e:
-            logging.error(f"Element not found: {e}")
-            raise UpdateAslaasError("Error while updating ASLAAS number")
-        except Exception as e:
-            logging.error(f"Error during update ASLAAS task: {e}")
-            raise UpdateAslaasError("Error while updating ASLAAS number")
+
+    # Takes account number and ASLAAS number and saves it using the open Update ASLAAS Number page
+    def update_aslaas_number(self, acc_no, aslaas_no):
+        # Enter account number
+        acc_no_input = self.wait_for_element(By.ID, 'CustomAgentAslaasNoFG.RD_ACC_NO')
+        acc_no_input.clear()
+        acc_no_input.send_keys(acc_no)
+
+        # Enter ASLAAS number
+        aslaas_no_input = self.wait_for_element(By.ID, 'CustomAgentAslaasNoFG.ASLAAS_NO')
+        aslaas_no_input.clear()
+        aslaas_no_input.send_keys(aslaas_no)
+
+        # Click Continue button
+        self.click_element(By.ID, 'LOAD_CONFIRM_PAGE')
+
+        # Click Save button and wait until the portal is back on the entry form
+        self.click_element(By.ID, 'ADD_FIELD_SUBMIT')
+        self.wait_for_element(By.ID, 'CustomAgentAslaasNoFG.RD_ACC_NO')
 
 
     # Fetches Available Accounts from portal and saves to a csv file in RDRecord folder
@@ -716,79 +1445,39 @@ class DOPWebAssistant:
         """
         Fetches available accounts from the DOP agent portal and saves them to a CSV file in the 'RDRecord' folder.
 
+        Returns:
+        str: Path of the saved CSV file.
+
         Raises:
         DownloadTaskError: If there is an error during any step of the download accounts list task.
         """
         try:
             # Navigate to Accounts page
-            accounts_button = self.driver.find_element(By.ID, 'Accounts')
-            accounts_button.click()
+            self.click_element(By.ID, 'Accounts')
             logging.info("Navigated to Accounts page successfully!")
 
             # Navigate to Agent Enquire & Update Screen
-            agent_enquire_button = self.driver.find_element(By.ID, 'Agent Enquire & Update Screen')
-            agent_enquire_button.click()
+            self.click_element(By.ID, 'Agent Enquire & Update Screen')
             logging.info("Navigated to Agent Enquire & Update Screen page successfully!")
 
             # Click Print Preview button and switch to new tab
-            while True:
-                try:
-                    print_preview_button = WebDriverWait(self.driver, 30).until(EC.element_to_be_clickable((By.ID, 'HREF_printPreview')))
-                    self.driver.execute_script("arguments[0].scrollIntoView();", print_preview_button)
-                    print_preview_button.click()
-                    break
-                except:
-                    logging.info("Error while clicking print preview button, trying again!")
-                    time.sleep(1)
-                    
+            handles_before = self.driver.window_handles
+            print_preview_button = self.wait_for(EC.element_to_be_clickable((By.ID, 'HREF_printPreview')))
+            self.driver.execute_script("arguments[0].scrollIntoView();", print_preview_button)
+            self.wait_for_overlay_gone()
+            print_preview_button.click()
             logging.info("Print Preview Button Clicked successfully!")
 
-            while True:
-                try:
-                    new_tab_handle = self.driver.window_handles[-1]  # Assuming the new tab is the last in the list
-                    self.driver.switch_to.window(new_tab_handle)
-                    break
-                except:
-                    time.sleep(1)
-            
+            self.wait_for_new_window(handles_before)
             logging.info("Switched to Print Preview tab successfully!")
 
-            # Define columns for DataFrame
-            columns = ["ac_no", "acc_holder_name", "denomination", "no_of_installments", "next_rd_due_date"]
-
-            # Create an empty DataFrame with defined columns and data types
-            data_types = {
-                'ac_no': str,
-                'no_of_installments': int
-            }
-            df = pd.DataFrame(columns=columns).astype(data_types)
-            acc_count = 0
-
+            # Wait for the print preview to be completely loaded
+            self.wait_for(lambda driver: driver.execute_script("return document.readyState") == "complete")
             logging.info("Started Extracting Accounts data!")
-            time.sleep(5)
-            
-            # Extract data from the print preview tab
-            while acc_count >= 0:
-                try:
-                    acc_no_element = self.driver.find_element(By.ID, f'HREF_CustomAgentRDAccountFG.ACCOUNT_NUMBER_ALL_ARRAY[{acc_count}]')
-                    acc_holder_element = self.driver.find_element(By.ID, f'HREF_CustomAgentRDAccountFG.ACCOUNT_NAME_ALL_ARRAY[{acc_count}]')
-                    acc_denomination_element = self.driver.find_element(By.ID, f'HREF_CustomAgentRDAccountFG.DEPOSIT_AMOUNT_ALL_ARRAY[{acc_count}]')
-                    no_install_element = self.driver.find_element(By.ID, f'HREF_CustomAgentRDAccountFG.MONTH_PAID_UPTO_ALL_ARRAY[{acc_count}]')
-                    next_date_element = self.driver.find_element(By.ID, f'HREF_CustomAgentRDAccountFG.NEXT_RD_INSTALLMENT_DATE_ALL_ARRAY[{acc_count}]')
-
-                    ac_no = str(acc_no_element.text)
-                    acc_holder_name = acc_holder_element.text
-                    denomination = acc_denomination_element.text.split('.')[0].replace(",", "")
-                    no_installments = no_install_element.text
-                    next_date = next_date_element.text
-
-                    temp_df = pd.DataFrame([[ac_no, acc_holder_name, denomination, no_installments, next_date]], columns=columns)
-
-                    df = pd.concat([df, temp_df])
-                    acc_count += 1
-                except Exception as e:
-                    logging.info(f"Parsed all accounts successfully! Total {acc_count} accounts!")
-                    acc_count = -1
+
+            # Extract data of all accounts from the print preview tab in one round trip
+            df = self.scrape_accounts_print_preview()
+            logging.info(f"Parsed all accounts successfully! Total {len(df)} accounts!")
             
             logging.info("Completed Extracting Accounts data!")
 
@@ -808,27 +1497,18 @@ class DOPWebAssistant:
             df.loc[df['next_rd_due_date'].notnull(), 'is_active'] = 1
             df['is_active'] = df['is_active'].astype(int)
 
-            # Calculate Account Opening Date
-            df['next_rd_due_date'] = pd.to_datetime(df['next_rd_due_date'], errors='coerce')
-            df['acc_opening_date'] = df.apply(lambda row: row['next_rd_due_date'] - pd.DateOffset(months=int(row['no_of_installments'])), axis=1)
+            # Calculate Account Opening Date for all accounts at once
+            df['acc_opening_date'] = add_months(df['next_rd_due_date'], -df['no_of_installments'])
 
             # Drop Next RD due date column
             df = df.drop('next_rd_due_date', axis=1)
 
             logging.info("DataFrame Edited Successfully!")
 
-            # Create 'RDRecord' folder if it doesn't exist
-            folder_name = "RDRecord"
-            if not os.path.exists(folder_name):
-                os.makedirs(folder_name)
-
-            # Generate file name with current timestamp
-            date_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_name = f"{folder_name}/RDRecord_{date_stamp}.csv"
-
-            # Save DataFrame to CSV file
-            df.to_csv(file_name, index=False)
+            # Save DataFrame as a snapshot in 'RDRecord' folder in the configured format
+            file_name = write_snapshot(df, "RDRecord", self.snapshot_format)
             logging.info("Download Data Successfully Completed!")
+            return file_name
 
         except NoSuchElementException as e:
             logging.error(f"Element not found: {e}")
@@ -838,6 +1518,27 @@ class DOPWebAssistant:
             raise DownloadTaskError(f"Error during downloading: {e}")
 
 
+    # Reads all account rows of the print preview tab with a single script call and returns a DataFrame
+    def scrape_accounts_print_preview(self):
+        """
+        Extracts every account row of the accounts print preview tab in one WebDriver round trip.
+
+        All *_ALL_ARRAY[i] cells are read by a single execute_script call instead of
+        five find_element calls per account, and the DataFrame is built in one step.
+
+        Returns:
+        DataFrame: Accounts with columns ac_no, acc_holder_name, denomination, no_of_installments and next_rd_due_date.
+        """
+        columns = ["ac_no", "acc_holder_name", "denomination", "no_of_installments", "next_rd_due_date"]
+        rows = self.driver.execute_script(self.PRINT_PREVIEW_SCRIPT)
+
+        df = pd.DataFrame(rows, columns=columns)
+        df['ac_no'] = df['ac_no'].astype(str)
+        df['denomination'] = df['denomination'].str.split('.').str[0].str.replace(",", "")
+        df['no_of_installments'] = df['no_of_installments'].astype(int)
+        return df
+
+
     # Downloads the xlsx file of aslaas details
     def download_aslaas_csv(self):
         """
@@ -849,40 +1550,48 @@ class DOPWebAssistant:
         """
         try:
             # Navigate to Accounts page
-            accounts_button = self.driver.find_element(By.ID, 'Accounts')
-            accounts_button.click()
+            self.click_element(By.ID, 'Accounts')
             logging.info("Navigated to Accounts page successfully!")
 
             # Navigate to ASLAAS Number Report
-            aslaas_report_button = self.driver.find_element(By.ID, 'ASLAAS Number Report')
-            aslaas_report_button.click()
+            self.click_element(By.ID, 'ASLAAS Number Report')
             logging.info("Navigated to ASLAAS Number Report page successfully!")
 
             # Click Search button and wait for overlay to disappear
-            search_button = self.driver.find_element(By.ID, "SEARCH_ASLAAS_NUMBER")
-            search_button.click()
-            wait = WebDriverWait(self.driver, 20)
-            wait.until(EC.invisibility_of_element_located((By.CLASS_NAME, "blockUI.blockOverlay")))
+            self.click_element(By.ID, "SEARCH_ASLAAS_NUMBER")
+            self.wait_for_overlay_gone()
             logging.info("Search Button Clicked successfully!")
 
             # Select output format - 4 refers to the xls file
-            select_outformat = self.driver.find_element(By.ID, "CustomAgentAslaasNoFG.OUTFORMAT")
+            select_outformat = self.wait_for_element(By.ID, "CustomAgentAslaasNoFG.OUTFORMAT")
             select = Select(select_outformat)
             select.select_by_value('4')
             logging.info("Excel Format Selection successful!")
 
-            # Click Download Button and wait for download to complete
-            download_button = self.driver.find_element(By.ID, "GENERATE_REPORT")
-            download_button.click()
-            wait.until(EC.invisibility_of_element_located((By.CLASS_NAME, "blockUI.blockOverlay")))
-            logging.info("Download Button Clicked successfully!")
+            # Fetch the report over HTTP if enabled, otherwise click Download Button and wait for download
+            df = None
+            if self.http_downloads:
+                try:
+                    old_path = os.path.join(self.temp_download_dir, "aslaas_report.xls")
+                    self.fetch_form_to_file(self.create_http_session(), self.capture_form("GENERATE_REPORT"), {}, old_path)
+                    df = pd.read_excel(old_path)
+                    os.remove(old_path)
+                    logging.info("Data Loaded over HTTP successfully!")
+                except Exception as e:
+                    logging.info(f"HTTP download failed, downloading with the browser: {e}")
+                    df = None
+
+            if df is None:
+                with self.task_download() as watcher:
+                    self.click_element(By.ID, "GENERATE_REPORT")
+                    old_path = watcher.wait(self.wait_timeouts['download'])
+                    logging.info("Download Button Clicked successfully!")
 
-            # Find the latest downloaded Excel file
-            old_path = self.find_latest_xls(self.temp_download_dir)
+                    df = pd.read_excel(old_path)
+                    logging.info("Data Loaded successfully!")
 
-            # Read Excel data into DataFrame
-            df = pd.read_excel(old_path)
-            logging.info("Data Loaded successfully!")
+                    # Remove the old Excel file
+                    os.remove(old_path)
 
             # Extract relevant columns from DataFrame
             df = df.iloc[7:, [2, 8]]  # Assuming the columns containing account and ASLAAS numbers
@@ -890,42 +1599,409 @@ class DOPWebAssistant:
             df['ac_no'] = df['ac_no'].astype(str)  # Convert account number to string
             df['aslaas_no'] = df['aslaas_no'].astype(str)  # Convert ASLAAS number to string
 
-            # Define new path for saving CSV file
-            new_path = os.path.join(self.temp_download_dir, "aslaas_report.csv")
-
-            # Save DataFrame to CSV file
-            df.to_csv(new_path, index=False)
+            # Save DataFrame to CSV file read by the database sync
+            df.to_csv(self.ASLAAS_REPORT_PATH, index=False)
             logging.info("CSV File Saved successfully!")
 
-            # Remove the old Excel file
-            os.remove(old_path)
-
         except Exception as e:
             logging.error(f"Error during Downloading: {e}")
             raise DownloadTaskError("Error While Downloading ASLAAS Details")
 
 
-    # Finds the latest csv file in a directory 
-    def find_latest_xls(self, directory):
+# Watches a download folder and returns the downloaded file as soon as its final rename lands
+class DownloadWatcher:
+    # Suffixes of files which browsers are still writing
+    PARTIAL_SUFFIXES = ('.part', '.crdownload', '.tmp')
+
+    def __init__(self, directory):
+        """
+        Starts watching a download folder, files which already exist are ignored.
+
+        Filesystem events (inotify on Linux, change notifications on Windows) wake the
+        watcher, with polling as fallback where neither is available.
+
+        Args:
+        directory (str): The folder where the browser saves the download.
+        """
+        self.directory = directory
+        self.known_files = set(os.listdir(directory))
+        self.events = None
+        try:
+            if sys.platform.startswith('linux'):
+                self.events = InotifyEvents(directory)
+            elif sys.platform == 'win32' and win32file is not None:
+                self.events = Win32ChangeEvents(directory)
+        except OSError as e:
+            logging.info(f"Filesystem events not available, polling download folder: {e}")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    # Returns path of the finished download or None while it is still in progress
+    def finished_file(self):
+        new_files = sorted(set(os.listdir(self.directory)) - self.known_files)
+        # Firefox creates an empty target file next to the .part file, so wait for every partial file
+        if any(name.endswith(self.PARTIAL_SUFFIXES) for name in new_files):
+            return None
+        for name in new_files:
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and os.path.getsize(path) > 0:
+                return path
+        return None
+
+
+    # Waits for the download to finish and returns its path
+    def wait(self, timeout):
         """
-        Finds the latest modified Excel file (.xls) in the specified directory.
+        Blocks until a new complete file appears in the folder.
 
         Args:
-        directory (str): The directory path where Excel files are located.
+        timeout (float): Maximum number of seconds to wait.
 
         Returns:
-        str: The file path of the latest modified Excel file (.xls).
+        str: Full path of the downloaded file.
+
+        Raises:
+        TimeoutException: If no complete download appears within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            path = self.finished_file()
+            if path is not None:
+                return path
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutException(f"Download did not complete in {self.directory}")
+            # Wake up on the next filesystem event, re-check at least every second
+            if self.events is not None:
+                self.events.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, 0.2))
+
+
+    # Stops watching the folder
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+
+# Linux inotify watch of a folder using libc
+class InotifyEvents:
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+
+    # Waits for the next event or timeout and drains pending events
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                os.read(self.fd, 65536)
+            except BlockingIOError:
+                pass
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+# Windows change notification of a folder using pywin32
+class Win32ChangeEvents:
+    def __init__(self, directory):
+        flags = win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_SIZE | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE
+        try:
+            self.handle = win32file.FindFirstChangeNotification(directory, False, flags)
+        except Exception as e:
+            raise OSError(str(e))
+
+
+    # Waits for the next change or timeout and re-arms the notification
+    def wait(self, timeout):
+        if win32event.WaitForSingleObject(self.handle, int(timeout * 1000)) == win32event.WAIT_OBJECT_0:
+            win32file.FindNextChangeNotification(self.handle)
+
+
+    def close(self):
+        win32file.FindCloseChangeNotification(self.handle)
+
+
+# Takes accounts and installments of a lot and splits them into shards of at most shard_size accounts
+def split_lot_into_shards(acc_nos, no_installments, shard_size):
+    """
+    Splits a LOT into consecutive shards which stay within the portal limit of accounts per LOT.
+
+    Args:
+    acc_nos (list): List of account numbers.
+    no_installments (list): List of number of installments corresponding to each account.
+    shard_size (int): Maximum number of accounts in one shard.
+
+    Returns:
+    list: Pairs of (account numbers, installments) lists.
+    """
+    shard_size = max(1, int(shard_size))
+    return [(list(acc_nos[i:i + shard_size]), list(no_installments[i:i + shard_size]))
+            for i in range(0, len(acc_nos), shard_size)]
+
+
+# Age after which the journal of an interrupted lot is discarded instead of resumed, lots of the same
+# accounts repeat every month and must not find the journal of an earlier month
+LOT_RESUME_HOURS = 12
+
+
+# Takes account numbers and installments of a lot and returns its journal, discarding an expired one
+def lot_journal(acc_nos, no_installments):
+    journal = journal_for('lot', acc_nos, no_installments)
+    journal.expire(LOT_RESUME_HOURS)
+    return journal
+
+
+# Takes account numbers of a shard and returns the key identifying it in the journal of its lot
+def shard_key(acc_nos):
+    return ",".join(map(str, acc_nos))
+
+
+# Takes a lot and the shard size and returns the journals of the whole lot and of each of its shards
+def lot_journals(acc_nos, no_installments, shard_size):
+    journals = [lot_journal(acc_nos, no_installments)]
+    shards = split_lot_into_shards(acc_nos, no_installments, shard_size)
+    if len(shards) > 1:
+        journals += [lot_journal(shard_acc_nos, shard_installments) for shard_acc_nos, shard_installments in shards]
+    return journals
+
+
+# Performs one shard of a lot in its own browser, runs in a worker process of the process pool
+def run_lot_shard(shard):
+    """
+    Opens a browser, logs in, performs the LOT of one shard and downloads its report.
+
+    Args:
+    shard (dict): Shard built by DOPWebAssistant.perform_sharded_lot_task.
+
+    Returns:
+    dict: The shard result with ref_no, report_path and error.
+    """
+    result = {
+        'index': shard['index'],
+        'acc_nos': shard['acc_nos'],
+        'no_installments': shard['no_installments'],
+        'ref_no': None,
+        'report_path': None,
+        'skipped': False,
+        'error': None
+    }
+    dwa = None
+    journal = lot_journal(shard['acc_nos'], shard['no_installments'])
+    try:
+        # Every shard downloads into its own folder so parallel downloads do not mix
+        dwa = DOPWebAssistant(temp_download_dir=os.path.join('temp', f"shard_{shard['index']}"))
+        dwa.user_id = shard['user_id']
+        dwa.user_password = shard['user_password']
+        dwa.portal_url = shard['portal_url']
+        paid = journal.last('paid')
+        result['ref_no'] = paid['ref_no'] if paid is not None else None
+        dwa.open_browser_portal()
+        dwa.login()
+        journal.append('login')
+        # The journal is kept until every shard of the lot succeeded, the parent applies the payment
+        result['ref_no'], result['report_path'] = dwa.perform_journaled_lot_task(shard['acc_nos'], shard['no_installments'], shard['download_path'], journal)
+    except Exception as e:
+        result['error'] = str(e)
+        # A shard which was paid before failing still reports its reference number
+        paid = journal.last('paid')
+        if paid is not None:
+            result['ref_no'] = paid['ref_no']
+    finally:
+        try:
+            if dwa is not None:
+                dwa.close_browser()
+        except WebDriverException:
+            pass
+    return result
+
+
+# Keeps one logged in browser session of DOPWebAssistant alive and shares it between tasks
+class DOPSessionManager:
+    def __init__(self, web_assistant, idle_timeout=600):
+        """
+        Wraps a DOPWebAssistant so that all portal workers share one authenticated browser session.
+
+        Args:
+        web_assistant (DOPWebAssistant): The web assistant whose driver is kept alive between tasks.
+        idle_timeout (int, optional): Seconds of inactivity after which the browser is closed. Defaults to 600.
+        """
+        self.dwa = web_assistant
+        self.idle_timeout = idle_timeout
+        self.lock = threading.RLock()
+        self.idle_timer = None
+        self.last_used = time.monotonic()
+        self.closing = False
+
+
+    # Context manager which gives a logged in web assistant to a task and keeps the session afterwards
+    @contextmanager
+    def session(self):
+        """
+        Yields the web assistant with a healthy, logged in browser session.
+
+        Only one task can use the session at a time, other workers wait until it is released.
+        The browser is opened and logged in only when there is no usable session.
+
+        Yields:
+        DOPWebAssistant: The web assistant with an authenticated driver.
 
         Raises:
-        ValueError: If no Excel files (.xls) are found in the directory.
+        OpenBrowserError: If the browser could not be opened.
+        LoginError: If logging in to the portal fails.
+        """
+        with self.lock:
+            self.cancel_idle_timer()
+            try:
+                self.ensure_logged_in()
+                yield self.dwa
+            finally:
+                self.last_used = time.monotonic()
+                if self.closing:
+                    self.close_session()
+                else:
+                    self.start_idle_timer()
+
+
+    # Makes sure the browser is alive and logged in, opens or logs in again only when needed
+    def ensure_logged_in(self):
+        """
+        Health-checks the current session and restores it when required.
+
+        A dead browser is replaced by a new one, and a session that was logged out by
+        the portal is logged in again without restarting the browser.
         """
-        # Get list of all Excel files (.xls) in the directory
-        files = glob.glob(os.path.join(directory, "*.xls"))
+        if not self.is_browser_alive():
+            logging.info("No usable browser session, opening a new one...")
+            self.close_session()
+            self.dwa.open_browser_portal()
+            self.dwa.login()
+            return
+
+        if self.is_logged_in():
+            logging.info("Reusing logged in browser session.")
+            return
+
+        # Go back to the portal home page, we may just be on a page without the menu
+        self.dwa.driver.get(self.dwa.portal_url)
+        if self.is_logged_in():
+            logging.info("Reusing logged in browser session.")
+            return
 
-        # Check if any Excel files (.xls) were found
-        if not files:
-            raise ValueError(f"No Excel files (.xls) found in directory: {directory}")
+        logging.info("Portal session expired, logging in again...")
+        self.dwa.login()
 
-        # Return the file with the latest modification time
-        return max(files, key=os.path.getmtime)
 
+    # Checks if the browser of web assistant is still running and switches to the main tab
+    def is_browser_alive(self):
+        """
+        Checks whether the WebDriver session is still usable.
+
+        Returns:
+        bool: True if the browser responds, False otherwise.
+        """
+        if self.dwa.driver is None:
+            return False
+        try:
+            handles = self.dwa.driver.window_handles
+            # Close tabs left behind by a failed task and go back to the main tab
+            for handle in handles[1:]:
+                self.dwa.driver.switch_to.window(handle)
+                self.dwa.driver.close()
+            self.dwa.driver.switch_to.window(handles[0])
+            return True
+        except WebDriverException as e:
+            logging.info(f"Browser session is not alive: {e}")
+            return False
+
+
+    # Checks if the portal still shows the logged in menu
+    def is_logged_in(self):
+        """
+        Checks whether the portal session is still logged in by looking for the Accounts menu.
+
+        Returns:
+        bool: True if the Accounts menu is present, False otherwise.
+        """
+        try:
+            return self.dwa.find_optional(By.ID, 'Accounts') is not None
+        except WebDriverException:
+            return False
+
+
+    # Starts the timer which closes the browser after idle timeout
+    def start_idle_timer(self):
+        if self.dwa.driver is None or self.idle_timeout <= 0:
+            return
+        self.idle_timer = threading.Timer(self.idle_timeout, self.close_if_idle)
+        self.idle_timer.daemon = True
+        self.idle_timer.start()
+
+
+    # Cancels the running idle timer if any
+    def cancel_idle_timer(self):
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+
+    # Called by the idle timer, closes the browser if no task used it in the meantime
+    def close_if_idle(self):
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self.last_used >= self.idle_timeout:
+                logging.info("Browser session idle timeout reached.")
+                self.close_session()
+        finally:
+            self.lock.release()
+
+
+    # Closes the browser session without raising
+    def close_session(self):
+        self.cancel_idle_timer()
+        try:
+            self.dwa.close_browser()
+        except WebDriverException as e:
+            logging.error(f"Error while closing browser session: {e}")
+
+
+    # Closes the session now, or after the running task when the session is busy and blocking is False
+    def close(self, blocking=True):
+        """
+        Closes the shared browser session.
+
+        Args:
+        blocking (bool, optional): Wait for a running task to finish. When False and a task is
+        using the session, the browser is closed as soon as that task releases it. Defaults to True.
+        """
+        if not self.lock.acquire(blocking=blocking):
+            self.closing = True
+            return
+        try:
+            self.close_session()
+        finally:
+            self.lock.release()